@@ -1,14 +1,22 @@
 from django.core.asgi import get_asgi_application
-import os
+import os, threading
 from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.security.websocket import AllowedHostsOriginValidator
 import chat.routing
+from chat.personas import registry
+from chat.semantic_cache import semantic_cache
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 django_asgi_app = get_asgi_application()
 
+# 페르소나와 의미 기반 캐시의 임베딩 모델은 첫 대화가 아닌 서버 시작 시 백그라운드에서 로드
+# (페르소나는 실패하면 첫 요청 때 다시 로드, 캐시는 로드 전에는 캐시 미스로 처리)
+threading.Thread(target=registry.warm_up, name='persona-warm-up', daemon=True).start()
+if semantic_cache is not None:
+    threading.Thread(target=semantic_cache.warm_up, name='semantic-cache-warm-up', daemon=True).start()
+
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
     "websocket":
@@ -75,6 +75,7 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     'corsheaders.middleware.CorsMiddleware',
+    'dashboard.middleware.VisitMiddleware',
     "django_prometheus.middleware.PrometheusAfterMiddleware",
 ]
 
@@ -210,4 +211,183 @@ CORS_ALLOWED_ORIGINS = [
     "https://platform.openai.com",
 ]
 
-CORS_URLS_REGEX = r'^/static/.*$'
\ No newline at end of file
+CORS_URLS_REGEX = r'^/static/.*$'
+
+#Story - 사용자별 위인 퍼즐 진행도 캐시 (퀴즈 결과가 저장되면 무효화)
+STORY_PROGRESS_CACHE_TTL = 10 * 60
+
+#Story - 위인 목록/상세 카탈로그 캐시 (Story 저장/삭제 시 버전 키가 바뀌면 워커가 다시 로드)
+STORY_CATALOG_VERSION_KEY = 'story:catalog:version'
+STORY_CATALOG_RELOAD_INTERVAL = 1  # 초, 이 주기마다 Redis의 버전 키를 확인
+STORY_CATALOG_CACHE_TTL = 24 * 60 * 60
+
+#Dashboard - 일별 활성 사용자 비트맵과 위인별 순 방문자 HyperLogLog 보관 기간 (월간 집계보다 길게)
+VISITS_RETENTION_DAYS = 62
+VISITS_USER_ID_REFRESH_INTERVAL = 60  # 초, 캐시된 최대 user_id보다 큰 값이 오면 이 주기마다 DB에서 다시 확인
+
+#Story - 대화창 접속 수를 모아두는 Redis 해시 (story_id -> 증가분, story/jobs.py가 주기적으로 DB에 반영)
+STORY_ACCESS_COUNT_KEY = 'story:access_cnt'
+
+#외부 API별 공용 keep-alive 커넥션 풀 (backend/upstream.py)
+UPSTREAM_HTTP = {
+    'openai': {
+        'TIMEOUT': 60,
+        'CONNECT_TIMEOUT': 5,
+        'MAX_CONNECTIONS': 50,
+        'KEEPALIVE_EXPIRY': 60,
+        # 실패하거나 SLOW_CALL_SECONDS보다 느린 호출 비율이 FAILURE_RATE 이상이면 OPEN_SECONDS 동안 차단
+        # HEDGE는 멱등한 호출(비스트리밍 응답, STT)에 한해 같은 종류 호출의 p95 지연 뒤 같은 요청을 한 번 더 보낸다. (스트리밍, 요약 호출의 지연은 제외)
+        'BREAKER': {
+            'FAILURE_RATE': 0.5,
+            'MIN_REQUESTS': 10,
+            'WINDOW': 60,
+            'SLOW_CALL_SECONDS': 20,
+            'OPEN_SECONDS': 30,
+            'HALF_OPEN_PROBES': 2,
+            'HEDGE': True,
+            'HEDGE_MIN_DELAY': 2,
+        },
+    },
+    'naver_stt': {
+        'TIMEOUT': 10,
+        'CONNECT_TIMEOUT': 3,
+        'MAX_CONNECTIONS': 20,
+        'KEEPALIVE_EXPIRY': 60,
+        'BREAKER': {
+            'FAILURE_RATE': 0.5,
+            'MIN_REQUESTS': 10,
+            'WINDOW': 60,
+            'SLOW_CALL_SECONDS': 5,
+            'OPEN_SECONDS': 15,
+            'HALF_OPEN_PROBES': 1,
+            'HEDGE': True,
+            'HEDGE_MIN_DELAY': 0.5,
+        },
+    },
+    'elevenlabs': {
+        'TIMEOUT': 30,
+        'CONNECT_TIMEOUT': 5,
+        'MAX_CONNECTIONS': 10,
+        'KEEPALIVE_EXPIRY': 60,
+        'BREAKER': {
+            'FAILURE_RATE': 0.5,
+            'MIN_REQUESTS': 5,
+            'WINDOW': 60,
+            'SLOW_CALL_SECONDS': 15,
+            'OPEN_SECONDS': 30,
+            'HALF_OPEN_PROBES': 1,
+        },
+    },
+}
+
+#Chat - 클라이언트가 stream 값을 보내지 않았을 때 스트리밍 응답 사용 여부
+CHAT_STREAM_RESPONSES = False
+
+#Chat - 대화 기록용 비동기 Redis 커넥션 풀 (프로세스 단위로 공유)
+CHAT_REDIS_URL = CACHES["default"]["LOCATION"]
+CHAT_REDIS_MAX_CONNECTIONS = 50
+
+#Chat - WebSocket 연결 시 서버에서 집계하는 대화창 접속 수를 Redis로 모아서 보내는 주기(초)
+# ENABLED가 False이면 접속 수와 방문자를 기록하지 않는다. (재생/부하 테스트용)
+CHAT_ACCESS_COUNT_ENABLED = True
+CHAT_ACCESS_COUNT_FLUSH_INTERVAL = 0.25
+# 프롬프트에 들어가는 대화 양은 CHAT_CONTEXT의 토큰 예산으로 정하고, 아래 값은 저장 상한으로만 사용
+CHAT_HISTORY_MAX_ENTRIES = 40
+CHAT_HISTORY_MAX_BYTES = 64 * 1024
+CHAT_HISTORY_TTL = 30 * 60  # 마지막 대화 이후 30분 동안 유지
+
+#Chat - 토큰 예산 기반 대화 맥락 (예산을 넘는 오래된 대화는 롤링 요약으로 접는다)
+CHAT_CONTEXT = {
+    'ENCODING': 'cl100k_base',
+    'HISTORY_TOKENS': 1200,
+    'SUMMARY_MAX_TOKENS': 300,
+    'SUMMARY_MODEL': 'gpt-3.5-turbo',
+}
+
+#Chat - 대화 기록 write-behind 저장 (Redis 스트림 -> python manage.py persist_transcripts -> ChatMessage)
+CHAT_TRANSCRIPTS = {
+    'ENABLED': True,
+    'STREAM': 'chat:transcripts',
+    'STREAM_MAXLEN': 1000000,  # DB 장애가 길어질 때를 대비한 스트림 최대 길이 (근사값)
+    'GROUP': 'transcript-writers',
+    'BATCH_SIZE': 500,
+    'BLOCK_MS': 1000,
+    'CLAIM_IDLE_MS': 60000,  # 이 시간 동안 ACK되지 않은 다른 워커의 항목을 가져와 처리
+    'RETRY_DELAY': 5,
+}
+
+#Chat - 위인별 인사말, 모델, 프롬프트, 후처리 규칙 (버전 키가 바뀌면 워커가 다시 로드)
+CHAT_PERSONAS_FILE = BASE_DIR / 'chat' / 'personas.json'
+CHAT_PERSONA_VERSION_KEY = 'chat:personas:version'
+CHAT_PERSONA_RELOAD_INTERVAL = 5
+
+#Chat - 파인튜닝 데이터의 고정 질문에는 모델 호출 없이 바로 답하는 로컬 의도 분류기
+# 임계값은 python manage.py evaluate_intents 결과의 정밀도/재현율을 보고 조정
+CHAT_INTENTS = {
+    'ENABLED': True,
+    'THRESHOLD': 0.7,
+    'NGRAM_RANGE': (1, 3),
+}
+
+#Chat - 페르소나 프롬프트의 상황별 예시 중 현재 메시지와 관련된 상위 TOP_K개만 전송
+# 전/후 프롬프트 토큰과 지연 비교는 python manage.py benchmark_prompts
+CHAT_PROMPT_SLIMMING = {
+    'ENABLED': True,
+    'TOP_K': 2,
+    'MIN_SCORE': 0.08,
+}
+
+#Chat - 비슷한 질문에 저장된 답변을 재사용하는 의미 기반 응답 캐시
+# 테스트/오프라인 환경에서는 EMBEDDER를 'chat.embeddings.HashingEmbedder'로 지정
+CHAT_SEMANTIC_CACHE = {
+    'ENABLED': True,
+    'EMBEDDER': 'chat.embeddings.FastEmbedEmbedder',
+    'EMBEDDER_OPTIONS': {},
+    'THRESHOLD': 0.92,
+    'MAX_ENTRIES': 1000,
+    'TTL': 6 * 60 * 60,
+    'MIN_CHARS': 5,
+}
+
+#Chat - 미리 빌드한 위인별 RAG 인덱스 (python manage.py build_rag_indexes)
+CHAT_RAG = {
+    'ENABLED': True,
+    'CORPUS_DIR': BASE_DIR / 'rag' / 'corpus',
+    'INDEX_DIR': BASE_DIR / 'rag' / 'indexes',
+    'EMBEDDER': 'chat.embeddings.FastEmbedEmbedder',
+    'EMBEDDER_OPTIONS': {},
+    'CHUNK_SIZE': 500,
+    'CHUNK_OVERLAP': 50,
+    'TOP_K': 1,
+    'WORKERS': 4,
+}
+
+#Chat - 음성 메시지 STT (네이버 Clova Speech Recognition)
+CHAT_STT_MAX_AUDIO_BYTES = 2 * 1024 * 1024
+
+#Chat - 동시에 들어온 동일한 GPT 요청을 한 번의 호출로 합치기
+CHAT_SINGLEFLIGHT = {
+    'ENABLED': True,
+    'LOCK_TTL': 60,
+    'RESULT_TTL': 10,
+    'POLL_INTERVAL': 0.05,
+}
+
+#Chat - OpenAI 호출 스케줄러 (프로세스 단위, 워커 수에 맞게 RPM/TPM을 나눠서 설정)
+CHAT_UPSTREAM_SCHEDULER = {
+    'MAX_CONCURRENCY': 16,
+    'REQUESTS_PER_MINUTE': 500,
+    'TOKENS_PER_MINUTE': 160000,
+    'MAX_QUEUE': 200,
+    'MAX_WAIT': 20,
+    'MAX_RETRIES': 2,
+    'RETRY_JITTER': 0.5,
+    # 연결 오류/타임아웃/5xx/429 재시도 간격: 0.5초부터 두 배씩, 최대 8초 (0~간격 사이 무작위)
+    'RETRY_BASE_DELAY': 0.5,
+    'RETRY_MAX_DELAY': 8,
+    'EXPECTED_COMPLETION_TOKENS': 300,
+}
+CHAT_BUSY_MESSAGE = "지금은 대화 요청이 많습니다. 잠시 후 다시 시도해 주세요."
+
+#Chat - OpenAI 서킷이 열렸을 때 페르소나에 fallback 문구가 없으면 사용하는 기본 응답
+CHAT_FALLBACK_MESSAGE = "지금은 답변을 드리기 어렵습니다. 잠시 후 다시 말을 걸어 주세요."
@@ -0,0 +1,161 @@
+import asyncio
+from unittest import mock
+import httpx
+from django.test import SimpleTestCase
+from .upstream import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen, is_upstream_failure
+
+
+def status_error(status_code):
+    request = httpx.Request('POST', 'https://example.com')
+    return httpx.HTTPStatusError('error', request=request, response=httpx.Response(status_code, request=request))
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch('backend.upstream.time.monotonic', return_value=1000.0)
+        self.monotonic = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(
+            'test', failure_rate=0.5, min_requests=4, window=30, slow_call_seconds=10,
+            open_seconds=15, half_open_probes=1, hedge=True, hedge_min_delay=0.01,
+        )
+
+    def test_opens_when_failure_rate_is_reached(self):
+        for failed in (False, False, True):
+            self.breaker.record(failed, 0.1)
+        self.assertEqual(self.breaker.state, CLOSED)
+        with self.assertLogs('backend.upstream', 'WARNING') as logs:
+            self.breaker.record(True, 0.1)
+        self.assertEqual(logs.output, ['WARNING:backend.upstream:Circuit test: closed -> open'])
+        self.assertEqual(self.breaker.state, OPEN)
+        with self.assertRaises(CircuitOpen):
+            self.breaker.acquire()
+        with self.assertRaises(CircuitOpen):
+            self.breaker.check()
+
+    def test_needs_min_requests_before_opening(self):
+        for _ in range(3):
+            self.breaker.record(True, 0.1)
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_slow_calls_count_as_failures(self):
+        with self.assertLogs('backend.upstream', 'WARNING'):
+            for _ in range(4):
+                self.breaker.record(False, 10)
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_old_calls_leave_the_window(self):
+        for _ in range(3):
+            self.breaker.record(True, 0.1)
+        self.monotonic.return_value += 31
+        self.breaker.record(True, 0.1)
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def open(self):
+        with self.assertLogs('backend.upstream', 'WARNING'):
+            for _ in range(4):
+                self.breaker.record(True, 0.1)
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_half_open_probe_closes_on_success(self):
+        self.open()
+        self.monotonic.return_value += 15
+        with self.assertLogs('backend.upstream', 'WARNING') as logs:
+            self.breaker.acquire()
+            self.assertEqual(self.breaker.state, HALF_OPEN)
+            # 확인 호출 수를 넘는 요청은 거절
+            with self.assertRaises(CircuitOpen):
+                self.breaker.acquire()
+            self.breaker.record(False, 0.1)
+        self.assertEqual(logs.output, [
+            'WARNING:backend.upstream:Circuit test: open -> half-open',
+            'WARNING:backend.upstream:Circuit test: half-open -> closed',
+        ])
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.breaker.acquire()
+
+    def test_half_open_probe_reopens_on_failure(self):
+        self.open()
+        self.monotonic.return_value += 15
+        with self.assertLogs('backend.upstream', 'WARNING'):
+            self.breaker.acquire()
+            self.breaker.record(True, 0.1)
+        self.assertEqual(self.breaker.state, OPEN)
+        with self.assertRaises(CircuitOpen):
+            self.breaker.check()
+
+    def test_cancelled_probe_is_returned(self):
+        self.open()
+        self.monotonic.return_value += 15
+        with self.assertLogs('backend.upstream', 'WARNING'):
+            self.breaker.acquire()
+        self.breaker.cancel()
+        self.breaker.acquire()
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+
+    def test_only_upstream_errors_count_as_failures(self):
+        self.assertTrue(is_upstream_failure(status_error(503)))
+        self.assertTrue(is_upstream_failure(status_error(429)))
+        self.assertFalse(is_upstream_failure(status_error(400)))
+        self.assertTrue(is_upstream_failure(httpx.ConnectError('refused')))
+
+    async def test_call_async_records_client_errors_as_success(self):
+        async def bad_request():
+            raise status_error(400)
+
+        for _ in range(4):
+            with self.assertRaises(httpx.HTTPStatusError):
+                await self.breaker.call_async(bad_request)
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_p95_is_kept_per_kind(self):
+        for _ in range(4):
+            self.breaker.record(False, 5.0, 'stream')
+        self.assertIsNone(self.breaker.p95('completion'))
+        for _ in range(4):
+            self.breaker.record(False, 0.2, 'completion')
+        self.assertAlmostEqual(self.breaker.p95('completion'), 0.2)
+        self.assertAlmostEqual(self.breaker.p95('stream'), 5.0)
+
+
+class HedgedCallTests(SimpleTestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker('hedge-test', min_requests=2, hedge=True, hedge_min_delay=0.01)
+        for _ in range(2):
+            self.breaker.record(False, 0.01, 'completion')
+
+    def slow_then_fast(self):
+        calls = []
+
+        async def call():
+            calls.append(len(calls))
+            await asyncio.sleep(0.2 if len(calls) == 1 else 0)
+            return len(calls)
+
+        return call, calls
+
+    async def test_sends_hedge_after_p95_and_uses_first_response(self):
+        call, calls = self.slow_then_fast()
+        released = []
+
+        async def admit():
+            return lambda: released.append(True)
+
+        result = await self.breaker.call_async(call, hedge=True, kind='completion', hedge_admit=admit)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(result, 2)
+        self.assertEqual(released, [True])
+
+    async def test_skips_hedge_when_admission_is_refused(self):
+        call, calls = self.slow_then_fast()
+
+        async def admit():
+            return None
+
+        await self.breaker.call_async(call, hedge=True, kind='completion', hedge_admit=admit)
+        self.assertEqual(len(calls), 1)
+
+    async def test_no_hedge_without_samples_for_the_kind(self):
+        call, calls = self.slow_then_fast()
+        await self.breaker.call_async(call, hedge=True, kind='summary')
+        self.assertEqual(len(calls), 1)
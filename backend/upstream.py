@@ -0,0 +1,312 @@
+# backend/upstream.py
+import asyncio, logging, threading, time
+from collections import deque
+import httpx
+import numpy as np
+from django.conf import settings
+from prometheus_client import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+# 외부 API별 요청 수와 새로 연 커넥션 수 (요청 수 - 커넥션 수 = 재사용된 요청 수)
+UPSTREAM_HTTP_REQUESTS = Counter(
+    'upstream_http_requests_total',
+    'Requests sent to upstream APIs',
+    ['upstream'],
+)
+UPSTREAM_HTTP_CONNECTIONS = Counter(
+    'upstream_http_connections_total',
+    'New TCP connections opened to upstream APIs',
+    ['upstream'],
+)
+# 새 커넥션을 열 때 TCP/TLS 핸드셰이크에 걸린 시간
+UPSTREAM_HTTP_HANDSHAKE_SECONDS = Histogram(
+    'upstream_http_handshake_seconds',
+    'Time spent on TCP and TLS handshakes for new upstream connections',
+    ['upstream'],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.0),
+)
+
+# 외부 API별 서킷 브레이커 상태 (0: closed, 1: half-open, 2: open)와 차단된 호출 수
+UPSTREAM_CIRCUIT_STATE = Gauge(
+    'upstream_circuit_state',
+    'Circuit breaker state per upstream (0 closed, 1 half-open, 2 open)',
+    ['upstream'],
+)
+UPSTREAM_CIRCUIT_REJECTED = Counter(
+    'upstream_circuit_rejected_total',
+    'Calls rejected without contacting the upstream because its circuit is open',
+    ['upstream'],
+)
+# 지연된 요청에 대해 보낸 헤지 요청 수와 헤지 요청이 먼저 응답한 수
+UPSTREAM_HEDGED_REQUESTS = Counter(
+    'upstream_hedged_requests_total',
+    'Hedged requests after the per-kind p95 delay, by outcome (sent, won, skipped when the scheduler has no room)',
+    ['upstream', 'outcome'],
+)
+
+CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+STATE_NAMES = ('closed', 'half-open', 'open')
+
+# 프로세스당 외부 API별로 하나씩 keep-alive 커넥션 풀을 공유한다.
+# 비동기 클라이언트는 Channels 이벤트 루프에서, 동기 클라이언트는 Celery 워커/관리 명령에서 사용한다.
+_async_clients = {}
+_sync_clients = {}
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+# httpcore trace 이벤트로 새 커넥션과 핸드셰이크 시간을 기록
+def _tracer(name):
+    started_at = None
+
+    def trace(event_name, info):
+        nonlocal started_at
+        if event_name == 'connection.connect_tcp.started':
+            started_at = time.perf_counter()
+        elif event_name == 'connection.connect_tcp.complete':
+            UPSTREAM_HTTP_CONNECTIONS.labels(name).inc()
+        elif event_name.endswith('.send_request_headers.started') and started_at is not None:
+            UPSTREAM_HTTP_HANDSHAKE_SECONDS.labels(name).observe(time.perf_counter() - started_at)
+            started_at = None
+
+    return trace
+
+
+def _client_options(name):
+    config = settings.UPSTREAM_HTTP[name]
+    return {
+        'timeout': httpx.Timeout(config['TIMEOUT'], connect=config['CONNECT_TIMEOUT']),
+        'limits': httpx.Limits(
+            max_connections=config['MAX_CONNECTIONS'],
+            max_keepalive_connections=config['MAX_CONNECTIONS'],
+            keepalive_expiry=config['KEEPALIVE_EXPIRY'],
+        ),
+    }
+
+
+def get_async_client(name):
+    client = _async_clients.get(name)
+    if client is None:
+        async def on_request(request):
+            UPSTREAM_HTTP_REQUESTS.labels(name).inc()
+            trace = _tracer(name)
+
+            async def async_trace(event_name, info):
+                trace(event_name, info)
+
+            request.extensions['trace'] = async_trace
+
+        client = httpx.AsyncClient(event_hooks={'request': [on_request]}, **_client_options(name))
+        _async_clients[name] = client
+        logger.info(f'Created async upstream client: {name}')
+    return client
+
+
+def get_client(name):
+    client = _sync_clients.get(name)
+    if client is None:
+        def on_request(request):
+            UPSTREAM_HTTP_REQUESTS.labels(name).inc()
+            request.extensions['trace'] = _tracer(name)
+
+        client = httpx.Client(event_hooks={'request': [on_request]}, **_client_options(name))
+        _sync_clients[name] = client
+        logger.info(f'Created upstream client: {name}')
+    return client
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+# 다시 보내면 성공할 수 있는 4xx (요청 시간 초과, 너무 이른 요청, 요청 한도 초과)
+RETRYABLE_STATUS_CODES = frozenset({408, 425, 429})
+
+
+def is_retryable_status(status_code):
+    return status_code >= 500 or status_code in RETRYABLE_STATUS_CODES
+
+
+# 서버 오류(5xx), 재시도 가능한 4xx(429 등), 타임아웃, 연결 오류만 외부 API 장애로 본다. 잘못된 요청(그 밖의 4xx)은 브레이커에 반영하지 않는다.
+def is_upstream_failure(error):
+    status_code = getattr(error, 'status_code', None)
+    if status_code is None and getattr(error, 'response', None) is not None:
+        status_code = getattr(error.response, 'status_code', None)
+    if status_code is not None:
+        return is_retryable_status(status_code)
+    return True
+
+
+# 외부 API 하나에 대한 프로세스 단위 서킷 브레이커
+# 최근 window초 동안의 호출 중 실패하거나 slow_call_seconds보다 느린 호출 비율이 failure_rate를 넘으면 열리고,
+# open_seconds 뒤에는 half-open 상태에서 소수의 호출만 통과시켜 복구 여부를 확인한다.
+class CircuitBreaker:
+    def __init__(self, name, failure_rate=0.5, min_requests=10, window=30, slow_call_seconds=10,
+                 open_seconds=15, half_open_probes=1, hedge=False, hedge_min_delay=0.5):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.window = window
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.calls = deque()
+        # 호출 종류(스트리밍, 요약, 일반 응답 등)별 성공한 호출의 지연, 헤지 기준 p95는 같은 종류끼리만 계산
+        self.latencies = {}
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probes = 0
+        self.lock = threading.Lock()
+        UPSTREAM_CIRCUIT_STATE.labels(name).set(CLOSED)
+
+    def _set_state(self, state):
+        if state != self.state:
+            logger.warning(f'Circuit {self.name}: {STATE_NAMES[self.state]} -> {STATE_NAMES[state]}')
+        self.state = state
+        UPSTREAM_CIRCUIT_STATE.labels(self.name).set(state)
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+        elif state == HALF_OPEN:
+            self.probes = 0
+        else:
+            self.calls.clear()
+            self.latencies.clear()
+
+    def _trim(self, now):
+        while self.calls and now - self.calls[0][0] > self.window:
+            self.calls.popleft()
+        for samples in self.latencies.values():
+            while samples and now - samples[0][0] > self.window:
+                samples.popleft()
+
+    # 열려 있으면 바로 CircuitOpen, half-open이면 확인용 호출 수만큼만 허용
+    def acquire(self):
+        with self.lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+                self._set_state(HALF_OPEN)
+            if self.state == CLOSED:
+                return
+            if self.state == HALF_OPEN and self.probes < self.half_open_probes:
+                self.probes += 1
+                return
+        UPSTREAM_CIRCUIT_REJECTED.labels(self.name).inc()
+        raise CircuitOpen(f'{self.name} circuit is open')
+
+    # 호출 전에 대기열/스케줄러를 거치지 않고 빠르게 실패시키기 위한 확인 (half-open 확인 호출은 소모하지 않음)
+    def check(self):
+        with self.lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at < self.open_seconds:
+                UPSTREAM_CIRCUIT_REJECTED.labels(self.name).inc()
+                raise CircuitOpen(f'{self.name} circuit is open')
+
+    # 결과 없이 취소된 확인 호출은 다른 요청이 다시 확인할 수 있도록 반납
+    def cancel(self):
+        with self.lock:
+            if self.state == HALF_OPEN and self.probes > 0:
+                self.probes -= 1
+
+    def record(self, failed, duration, kind='default'):
+        bad = failed or duration >= self.slow_call_seconds
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self._set_state(OPEN if bad else CLOSED)
+                return
+            if self.state == OPEN:
+                return
+            now = time.monotonic()
+            self.calls.append((now, bad, duration))
+            if not bad:
+                self.latencies.setdefault(kind, deque()).append((now, duration))
+            self._trim(now)
+            if len(self.calls) >= self.min_requests:
+                bad_calls = sum(1 for _, call_bad, _ in self.calls if call_bad)
+                if bad_calls / len(self.calls) >= self.failure_rate:
+                    self._set_state(OPEN)
+
+    # kind 호출 중 최근 성공한 호출의 p95 지연, 표본이 부족하면 None
+    def p95(self, kind='default'):
+        with self.lock:
+            self._trim(time.monotonic())
+            durations = [duration for _, duration in self.latencies.get(kind, ())]
+        if len(durations) < self.min_requests:
+            return None
+        return max(float(np.percentile(durations, 95)), self.hedge_min_delay)
+
+    def call(self, fn):
+        self.acquire()
+        started_at = time.perf_counter()
+        try:
+            result = fn()
+        except Exception as e:
+            self.record(is_upstream_failure(e), time.perf_counter() - started_at)
+            raise
+        self.record(False, time.perf_counter() - started_at)
+        return result
+
+    # hedge=True인 경우 멱등한 호출에 한해 같은 kind 호출의 p95 지연 뒤에도 응답이 없으면 같은 요청을 한 번 더 보내 먼저 온 응답을 사용
+    # hedge_admit이 있으면 헤지 요청을 보내기 전에 호출해 자리를 받고(반납 함수 반환), None이면 헤지하지 않는다.
+    async def call_async(self, fn, hedge=False, kind='default', hedge_admit=None):
+        self.acquire()
+        started_at = time.perf_counter()
+        try:
+            if hedge and self.hedge:
+                result = await self._hedged(fn, kind, hedge_admit)
+            else:
+                result = await fn()
+        except asyncio.CancelledError:
+            self.cancel()
+            raise
+        except Exception as e:
+            self.record(is_upstream_failure(e), time.perf_counter() - started_at, kind)
+            raise
+        self.record(False, time.perf_counter() - started_at, kind)
+        return result
+
+    async def _hedged(self, fn, kind, hedge_admit):
+        delay = self.p95(kind)
+        if delay is None:
+            return await fn()
+
+        tasks = [asyncio.ensure_future(fn())]
+        release = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                release = await hedge_admit() if hedge_admit is not None else (lambda: None)
+                if release is None:
+                    UPSTREAM_HEDGED_REQUESTS.labels(self.name, 'skipped').inc()
+                else:
+                    UPSTREAM_HEDGED_REQUESTS.labels(self.name, 'sent').inc()
+                    tasks.append(asyncio.ensure_future(fn()))
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            UPSTREAM_HEDGED_REQUESTS.labels(self.name, 'won').inc()
+                        return task.result()
+            # 모두 실패한 경우 원래 요청의 오류를 전달
+            return tasks[0].result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            if release is not None:
+                release()
+
+
+def get_breaker(name):
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                config = settings.UPSTREAM_HTTP[name].get('BREAKER', {})
+                breaker = CircuitBreaker(name, **{key.lower(): value for key, value in config.items()})
+                _breakers[name] = breaker
+    return breaker
@@ -0,0 +1,66 @@
+# chat/access_counter.py
+import asyncio, logging
+from collections import Counter, defaultdict
+from datetime import date
+from channels.db import database_sync_to_async
+from django.conf import settings
+from dashboard.visits import add_visit_commands, visit_filter
+from .history import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+# WebSocket 연결마다 Redis에 쓰지 않고 프로세스 안에서 위인별 접속 수를 모았다가
+# flush_interval마다 한 번의 파이프라인(HINCRBY)으로 접속 수 해시(story/jobs.py가 DB에 반영)에 더한다.
+# 같은 파이프라인으로 로그인 사용자도 일별 활성 사용자 비트맵/위인별 HyperLogLog에 기록한다.
+# (없는 위인이나 사용자는 flush 시 카탈로그/최대 user_id로 걸러낸다.)
+# 프로세스가 종료되면 마지막 flush_interval 동안의 접속 수는 유실될 수 있다.
+class AccessCounter:
+    def __init__(self, key, flush_interval):
+        self.key = key
+        self.flush_interval = flush_interval
+        self.counts = Counter()
+        self.visitors = defaultdict(set)
+        self.task = None
+
+    def record(self, story_id, user_id=None):
+        if not settings.CHAT_ACCESS_COUNT_ENABLED:
+            return
+        self.counts[str(story_id)] += 1
+        if user_id is not None:
+            self.visitors[str(story_id)].add(user_id)
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while self.counts:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        counts, self.counts = self.counts, Counter()
+        visitors, self.visitors = self.visitors, defaultdict(set)
+        if not counts:
+            return
+        try:
+            story_ids, known_user_ids = await database_sync_to_async(self.known_ids)(counts, set().union(*visitors.values()))
+            async with get_redis().pipeline(transaction=False) as pipe:
+                for story_id in story_ids:
+                    pipe.hincrby(self.key, story_id, counts[story_id])
+                add_visit_commands(pipe, date.today(), known_user_ids, {
+                    story_id: [f'user:{user_id}' for user_id in visitors[story_id] if user_id in known_user_ids]
+                    for story_id in story_ids if visitors[story_id] & known_user_ids
+                })
+                await pipe.execute()
+        except Exception as e:
+            # 다음 주기에 다시 반영
+            self.counts.update(counts)
+            for story_id, members in visitors.items():
+                self.visitors[story_id].update(members)
+            logger.error(f'Failed to flush access counts for {len(counts)} stories: {str(e)}')
+
+    def known_ids(self, story_ids, user_ids):
+        return visit_filter.known_story_ids(story_ids), visit_filter.known_user_ids(user_ids)
+
+
+access_counter = AccessCounter(settings.STORY_ACCESS_COUNT_KEY, settings.CHAT_ACCESS_COUNT_FLUSH_INTERVAL)
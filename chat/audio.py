@@ -0,0 +1,100 @@
+# chat/audio.py
+import io, logging, wave
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 샘플 폭(바이트)별 numpy 자료형과 정규화 기준값
+SAMPLE_FORMATS = {
+    1: (np.uint8, 128.0),
+    2: (np.int16, 32768.0),
+    4: (np.int32, 2147483648.0),
+}
+
+
+def is_wav(data):
+    return len(data) > 12 and data[:4] == b'RIFF' and data[8:12] == b'WAVE'
+
+
+def _read_wav(data):
+    with wave.open(io.BytesIO(data)) as wav:
+        channels = wav.getnchannels()
+        sample_width = wav.getsampwidth()
+        rate = wav.getframerate()
+        frames = wav.readframes(wav.getnframes())
+
+    # 스트리밍 녹음이 중간에 끊겨 마지막 프레임이 잘린 경우 온전한 프레임까지만 사용
+    frame_size = sample_width * channels
+    frames = frames[:len(frames) - len(frames) % frame_size]
+
+    dtype, scale = SAMPLE_FORMATS[sample_width]
+    samples = np.frombuffer(frames, dtype=dtype).astype(np.float32)
+    if sample_width == 1:
+        samples -= 128.0
+    samples /= scale
+
+    # 다채널은 평균으로 모노 다운믹스
+    return samples.reshape(-1, channels).mean(axis=1), rate
+
+
+def _resample(samples, rate, target_rate):
+    if rate == target_rate or len(samples) == 0:
+        return samples
+
+    # 다운샘플링 시 에일리어싱을 줄이기 위해 이동 평균으로 저역 통과 후 선형 보간
+    if rate > target_rate:
+        width = int(np.ceil(rate / target_rate))
+        if width > 1:
+            samples = np.convolve(samples, np.full(width, 1.0 / width, dtype=np.float32), mode='same')
+
+    length = int(round(len(samples) * target_rate / rate))
+    positions = np.arange(length, dtype=np.float64) * (rate / target_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def _trim_silence(samples, rate, threshold_db, frame_ms, padding_ms):
+    frame = max(1, int(rate * frame_ms / 1000))
+    count = len(samples) // frame
+    if count == 0:
+        return samples
+
+    rms = np.sqrt(np.mean(samples[:count * frame].reshape(count, frame) ** 2, axis=1))
+    voiced = np.flatnonzero(rms > 10 ** (threshold_db / 20))
+    if len(voiced) == 0:
+        return samples
+
+    padding = int(rate * padding_ms / 1000)
+    start = max(0, voiced[0] * frame - padding)
+    end = min(len(samples), (voiced[-1] + 1) * frame + padding)
+    return samples[start:end]
+
+
+def _write_wav(samples, rate):
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767.0).astype('<i2')
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+# STT 업로드 전 PCM WAV 음성을 16kHz 모노로 변환하고 앞뒤 무음을 잘라낸다.
+# 디코딩할 수 없는 형식(webm/opus 등)은 그대로 반환한다.
+def normalize_audio(data, target_rate=16000, threshold_db=-40, frame_ms=20, padding_ms=150):
+    if not is_wav(data):
+        return data
+
+    try:
+        samples, rate = _read_wav(data)
+    except (wave.Error, KeyError, EOFError, ValueError) as e:
+        logger.warning(f'Could not decode WAV audio, sending as is: {str(e)}')
+        return data
+
+    samples = _resample(samples, rate, target_rate)
+    samples = _trim_silence(samples, target_rate, threshold_db, frame_ms, padding_ms)
+    normalized = _write_wav(samples, target_rate)
+
+    # 변환 결과가 오히려 커지면 원본 사용
+    return normalized if len(normalized) < len(data) else data
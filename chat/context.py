@@ -0,0 +1,100 @@
+# chat/context.py
+import logging
+import tiktoken
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# chat completions 형식에서 메시지마다 붙는 고정 토큰 수
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMING_TOKENS = 3
+
+SUMMARY_PROMPT = (
+    "너는 역사 인물과 사용자의 대화를 요약하는 도우미야. "
+    "기존 요약과 이어지는 대화를 합쳐 사용자가 물어본 내용, 인물이 답한 핵심 사실, 사용자에 대해 알게 된 정보를 "
+    "한국어로 간결하게 정리해. 이후 대화의 맥락 유지에 필요 없는 내용은 버려."
+)
+
+
+# 로컬 토크나이저로 메시지 토큰 수를 계산한다. 인코딩 파일은 처음 사용할 때 한 번만 로드한다.
+class TokenCounter:
+    def __init__(self, encoding_name):
+        self.encoding_name = encoding_name
+        self._encoding = None
+
+    @property
+    def loaded(self):
+        return self._encoding is not None
+
+    @property
+    def encoding(self):
+        if self._encoding is None:
+            self._encoding = tiktoken.get_encoding(self.encoding_name)
+        return self._encoding
+
+    def count_text(self, text):
+        return len(self.encoding.encode(text or '', disallowed_special=()))
+
+    def count_message(self, message):
+        return MESSAGE_OVERHEAD_TOKENS + self.count_text(message.get('content'))
+
+    def count_messages(self, messages):
+        return REPLY_PRIMING_TOKENS + sum(self.count_message(message) for message in messages)
+
+
+# 고정 메시지(프롬프트, 요약, RAG, 사용자 메시지) 뒤에 예산 안에서 최근 대화를 최대한 채워 넣는다.
+# 예산을 넘는 오래된 대화는 folded로 돌려주어 요약으로 접히게 한다.
+class ContextBuilder:
+    def __init__(self, counter, history_tokens, summary_max_tokens):
+        self.counter = counter
+        self.history_tokens = history_tokens
+        self.summary_max_tokens = summary_max_tokens
+
+    def summary_message(self, summary):
+        return {"role": "system", "content": f"지금까지의 대화 요약: {summary}"}
+
+    def build(self, prefix, summary, history, context, user_message):
+        # 최신 대화부터 사용자/답변 한 쌍 단위로 예산이 허용하는 만큼 포함
+        budget = self.history_tokens
+        start = len(history)
+        while start >= 2:
+            cost = sum(self.counter.count_message(message) for message in history[start - 2:start])
+            if cost > budget:
+                break
+            budget -= cost
+            start -= 2
+        # 짝이 맞지 않는 맨 앞 항목은 함께 요약으로 접는다.
+        folded = history[:start]
+
+        messages = [*prefix]
+        if summary:
+            messages.append(self.summary_message(summary))
+        messages.extend(history[start:])
+        messages.extend(context)
+        messages.append(user_message)
+        return messages, folded
+
+
+def build_context_builder(config):
+    return ContextBuilder(
+        TokenCounter(config['ENCODING']),
+        history_tokens=config['HISTORY_TOKENS'],
+        summary_max_tokens=config['SUMMARY_MAX_TOKENS'],
+    )
+
+
+def summary_request(summary, folded):
+    lines = []
+    if summary:
+        lines.append(f"[기존 요약]\n{summary}")
+    lines.append("[이어지는 대화]")
+    for message in folded:
+        speaker = '사용자' if message.get('role') == 'user' else '인물'
+        lines.append(f"{speaker}: {message.get('content', '')}")
+    return [
+        {"role": "system", "content": SUMMARY_PROMPT},
+        {"role": "user", "content": "\n".join(lines)},
+    ]
+
+
+context_builder = build_context_builder(settings.CHAT_CONTEXT)
@@ -0,0 +1,67 @@
+# chat/embeddings.py
+import threading, unicodedata, zlib
+import numpy as np
+from django.utils.module_loading import import_string
+
+
+def normalize_text(text):
+    return ' '.join(unicodedata.normalize('NFKC', text).lower().split())
+
+
+def _normalize_rows(vectors):
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+# 외부 의존성 없이 문자 n-gram을 해싱해 임베딩하는 로컬 임베더 (테스트/오프라인용)
+class HashingEmbedder:
+    loaded = True
+
+    def __init__(self, dim=512, ngram_range=(1, 3)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+
+    def load(self):
+        pass
+
+    def _embed_one(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        text = normalize_text(text)
+        for n in range(self.ngram_range[0], self.ngram_range[1] + 1):
+            for i in range(len(text) - n + 1):
+                vector[zlib.crc32(text[i:i + n].encode('utf-8')) % self.dim] += 1.0
+        return vector
+
+    def embed(self, texts):
+        return _normalize_rows(np.stack([self._embed_one(text) for text in texts]))
+
+
+# fastembed(ONNX) 기반 다국어 문장 임베더
+class FastEmbedEmbedder:
+    def __init__(self, model_name='sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2', dim=384):
+        self.model_name = model_name
+        self.dim = dim
+        self.model = None
+        self.lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self.model is not None
+
+    # 처음 로드할 때 모델 파일을 내려받을 수 있으므로 요청 경로가 아닌 시작 시점(warm_up)에 호출
+    def load(self):
+        with self.lock:
+            if self.model is None:
+                from fastembed import TextEmbedding
+                self.model = TextEmbedding(model_name=self.model_name)
+
+    def embed(self, texts):
+        self.load()
+        return _normalize_rows(np.stack(list(self.model.embed([normalize_text(text) for text in texts]))))
+
+
+# 설정의 EMBEDDER 경로와 EMBEDDER_OPTIONS로 임베더 생성
+def build_embedder(config):
+    return import_string(config['EMBEDDER'])(**config.get('EMBEDDER_OPTIONS', {}))
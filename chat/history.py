@@ -0,0 +1,198 @@
+# chat/history.py
+import json, time
+import redis.asyncio as aioredis
+from django.conf import settings
+from .metrics import CHAT_HISTORY_BYTES
+
+# 프로세스당 하나의 커넥션 풀을 공유한다.
+_pool = None
+
+# 전체 세션의 대화 기록 바이트 합계 (연결이 끊겨 TTL까지 남아 있는 세션 포함)
+# 세션별 크기(해시)와 만료 시각(정렬 집합)을 함께 두고, 스크립트가 실행될 때마다
+# 만료 시각이 지난 세션의 크기를 합계에서 뺀다. (위인 story_id와 겹치지 않도록 별도 prefix 사용)
+TOTAL_BYTES_KEY = 'chathistory:total_bytes'
+SESSION_BYTES_KEY = 'chathistory:session_bytes'
+SESSION_EXPIRY_KEY = 'chathistory:session_expiry'
+REAP_LIMIT = 100
+
+# KEYS[5]: 전체 합계, KEYS[6]: 세션별 크기, KEYS[7]: 세션별 만료 시각 / ARGV[4]: 현재 시각(초)
+# 만료된 세션을 정리한 뒤 KEYS[1] 세션의 크기를 new_size로 바꾸고 전체 합계를 반환하는 공용 함수
+TOTAL_FUNCTIONS = f"""
+local function reap(now)
+    local expired = redis.call('ZRANGEBYSCORE', KEYS[7], '-inf', now, 'LIMIT', 0, {REAP_LIMIT})
+    for _, key in ipairs(expired) do
+        redis.call('DECRBY', KEYS[5], tonumber(redis.call('HGET', KEYS[6], key) or '0'))
+        redis.call('HDEL', KEYS[6], key)
+        redis.call('ZREM', KEYS[7], key)
+    end
+end
+
+local function set_size(new_size, expires_at)
+    local previous = tonumber(redis.call('HGET', KEYS[6], KEYS[1]) or '0')
+    local total = redis.call('INCRBY', KEYS[5], new_size - previous)
+    if new_size > 0 then
+        redis.call('HSET', KEYS[6], KEYS[1], new_size)
+        redis.call('ZADD', KEYS[7], expires_at, KEYS[1])
+    else
+        redis.call('HDEL', KEYS[6], KEYS[1])
+        redis.call('ZREM', KEYS[7], KEYS[1])
+    end
+    if total < 0 then
+        redis.call('SET', KEYS[5], 0)
+        total = 0
+    end
+    return total
+end
+"""
+
+# 항목 추가 후 개수/바이트 한도를 넘는 오래된 항목을 제거하고 TTL을 갱신한다.
+# 리스트 맨 앞 항목의 순번(head)은 앞에서 제거한 항목 수만큼 늘어난다.
+# KEYS[1]: 대화 기록 리스트, KEYS[2]: 바이트 카운터, KEYS[3]: 요약, KEYS[4]: 맨 앞 항목의 순번
+# ARGV[1]: TTL(초), ARGV[2]: 최대 항목 수, ARGV[3]: 최대 바이트, ARGV[5..]: 추가할 항목
+APPEND_SCRIPT = TOTAL_FUNCTIONS + """
+local now = tonumber(ARGV[4])
+reap(now)
+local added = 0
+for i = 5, #ARGV do
+    redis.call('RPUSH', KEYS[1], ARGV[i])
+    added = added + string.len(ARGV[i])
+end
+local total = tonumber(redis.call('GET', KEYS[2]) or '0') + added
+local length = redis.call('LLEN', KEYS[1])
+local max_entries = tonumber(ARGV[2])
+local max_bytes = tonumber(ARGV[3])
+local popped = 0
+while length > 0 and (length > max_entries or total > max_bytes) do
+    local item = redis.call('LPOP', KEYS[1])
+    total = total - string.len(item)
+    length = length - 1
+    popped = popped + 1
+end
+local head = tonumber(redis.call('GET', KEYS[4]) or '0') + popped
+redis.call('SET', KEYS[2], total, 'EX', ARGV[1])
+redis.call('SET', KEYS[4], head, 'EX', ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('EXPIRE', KEYS[3], ARGV[1])
+return {total, set_size(total, now + tonumber(ARGV[1]))}
+"""
+
+
+# 요약에 반영된 오래된 항목을 앞에서부터 제거하고 요약을 저장한다.
+# 항목 내용이 아니라 순번으로 위치를 찾으므로, 같은 내용의 메시지가 반복되어도 요약되지 않은 항목은 지우지 않는다.
+# 그 사이 한도 초과로 이미 잘려나간 항목은 head가 늘어나 있으므로 남은 만큼만 제거된다.
+# KEYS[1]: 대화 기록 리스트, KEYS[2]: 바이트 카운터, KEYS[3]: 요약, KEYS[4]: 맨 앞 항목의 순번
+# ARGV[1]: TTL(초), ARGV[2]: 마지막으로 요약된 항목 다음 순번, ARGV[3]: 새 요약
+FOLD_SCRIPT = TOTAL_FUNCTIONS + """
+local now = tonumber(ARGV[4])
+reap(now)
+local head = tonumber(redis.call('GET', KEYS[4]) or '0')
+local count = tonumber(ARGV[2]) - head
+local length = redis.call('LLEN', KEYS[1])
+if count > length then
+    count = length
+end
+local total = tonumber(redis.call('GET', KEYS[2]) or '0')
+for i = 1, count do
+    total = total - string.len(redis.call('LPOP', KEYS[1]))
+end
+if count > 0 then
+    head = head + count
+end
+if total < 0 then
+    total = 0
+end
+redis.call('SET', KEYS[2], total, 'EX', ARGV[1])
+redis.call('SET', KEYS[3], ARGV[3], 'EX', ARGV[1])
+redis.call('SET', KEYS[4], head, 'EX', ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return {total, set_size(total, now + tonumber(ARGV[1]))}
+"""
+
+
+# 세션의 대화 기록을 지우고 전체 합계에서 뺀다.
+DELETE_SCRIPT = TOTAL_FUNCTIONS + """
+reap(tonumber(ARGV[4]))
+redis.call('DEL', KEYS[1], KEYS[2], KEYS[3], KEYS[4])
+return {0, set_size(0, 0)}
+"""
+
+
+def get_redis_pool():
+    global _pool
+    if _pool is None:
+        _pool = aioredis.ConnectionPool.from_url(
+            settings.CHAT_REDIS_URL,
+            max_connections=settings.CHAT_REDIS_MAX_CONNECTIONS,
+        )
+    return _pool
+
+
+def get_redis():
+    return aioredis.Redis(connection_pool=get_redis_pool())
+
+
+def history_key(story_id, session_id):
+    return f'gptchat:{story_id}:{session_id}'
+
+
+# 세션 하나의 대화 기록을 Redis 리스트에 비동기로 저장/조회하는 저장소
+# 세션별 키에 유휴 TTL과 항목 수/바이트 상한을 두어 메모리가 활성 세션 수에 비례하도록 한다.
+# 토큰 예산을 넘은 오래된 대화는 롤링 요약({key}:summary)으로 접어서 보관한다.
+class ChatHistoryStore:
+    def __init__(self, key, redis=None, max_entries=6, max_bytes=16384, ttl=1800):
+        self.redis = redis or get_redis()
+        self.key = key
+        self.bytes_key = f'{key}:bytes'
+        self.summary_key = f'{key}:summary'
+        self.head_key = f'{key}:head'
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.append_script = self.redis.register_script(APPEND_SCRIPT)
+        self.fold_script = self.redis.register_script(FOLD_SCRIPT)
+        self.delete_script = self.redis.register_script(DELETE_SCRIPT)
+
+    @property
+    def keys(self):
+        return [self.key, self.bytes_key, self.summary_key, self.head_key, TOTAL_BYTES_KEY, SESSION_BYTES_KEY, SESSION_EXPIRY_KEY]
+
+    # 스크립트가 돌려준 (세션 크기, 전체 합계)에서 전체 합계를 지표로 기록
+    def _track(self, result):
+        size, total = result
+        CHAT_HISTORY_BYTES.set(int(total))
+        return int(size)
+
+    # 한 번의 왕복으로 전체 대화 기록, 롤링 요약, 맨 앞 항목의 순번 조회
+    async def load(self):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.lrange(self.key, 0, -1)
+            pipe.get(self.summary_key)
+            pipe.get(self.head_key)
+            items, summary, head = await pipe.execute()
+        return [json.loads(item) for item in items], summary.decode() if summary else None, int(head or 0)
+
+    # 추가와 한도 적용, TTL 갱신을 하나의 원자적 스크립트로 처리
+    async def append(self, *messages):
+        encoded = [json.dumps(message, ensure_ascii=False) for message in messages]
+        return self._track(await self.append_script(
+            keys=self.keys,
+            args=[self.ttl, self.max_entries, self.max_bytes, int(time.time()), *encoded],
+        ))
+
+    # 요약된 앞쪽 항목 제거와 새 요약 저장을 하나의 원자적 스크립트로 처리
+    # head는 folded를 불러올 때(load) 맨 앞 항목의 순번
+    async def fold(self, folded, summary, head):
+        if not folded:
+            return
+        self._track(await self.fold_script(
+            keys=self.keys,
+            args=[self.ttl, head + len(folded), summary, int(time.time())],
+        ))
+
+    async def clear(self):
+        self._track(await self.delete_script(keys=self.keys, args=[self.ttl, 0, 0, int(time.time())]))
+
+    # 연결 종료 시 호출, delete가 False이면 TTL이 만료될 때까지 기록을 남겨둔다. (만료되면 전체 합계에서 빠진다.)
+    async def release(self, delete=False):
+        if delete:
+            await self.clear()
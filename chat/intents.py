@@ -0,0 +1,47 @@
+# chat/intents.py
+import json
+from .ngram_index import CharNgramIndex
+
+
+# 파인튜닝 JSONL에서 (질문, 답변) 쌍을 읽는다. 한 대화 안의 user -> assistant 순서쌍을 모두 사용한다.
+def load_intent_pairs(path):
+    pairs = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            messages = json.loads(line)['messages']
+            for question, answer in zip(messages, messages[1:]):
+                if question['role'] == 'user' and answer['role'] == 'assistant':
+                    pairs.append((question['content'], answer['content']))
+    return pairs
+
+
+# 학습 질문에 대한 문자 n-gram TF-IDF 최근접 이웃으로 고정 질문에 대한 답변을 찾는 로컬 분류기
+class IntentMatcher:
+    def __init__(self, pairs, threshold=0.8, ngram_range=(1, 3)):
+        self.questions = [question for question, _ in pairs]
+        self.answers = [answer for _, answer in pairs]
+        self.threshold = threshold
+        self.ngram_range = tuple(ngram_range)
+        self.index = CharNgramIndex(self.questions, self.ngram_range)
+
+    def __len__(self):
+        return len(self.answers)
+
+    # 가장 가까운 질문의 인덱스와 코사인 유사도 반환
+    def match(self, text):
+        found = self.index.search(text, k=1)
+        if not found:
+            return None, 0.0
+        return found[0]
+
+    def answer(self, text, threshold=None):
+        index, score = self.match(text)
+        if index is None or score < (self.threshold if threshold is None else threshold):
+            return None
+        return self.answers[index]
+
+
+def load_intent_matcher(path, threshold, ngram_range):
+    return IntentMatcher(load_intent_pairs(path), threshold=threshold, ngram_range=ngram_range)
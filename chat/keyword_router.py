@@ -0,0 +1,66 @@
+# chat/keyword_router.py
+from collections import deque
+
+
+# 위인별 키워드 -> 주제 매칭을 위한 Aho-Corasick 오토마톤
+# 메시지를 한 번만 훑어 포함된 모든 주제를 찾으므로, 키워드와 주제가 늘어나도 글자당 비용이 일정하다.
+# 공백은 무시하고 매칭하므로 '한산도 대첩'과 '한산도대첩'을 같은 키워드로 본다.
+class KeywordRouter:
+    def __init__(self, topics):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [()]
+        self.topics = []
+
+        for topic, keywords in topics:
+            self.topics.append(topic)
+            for keyword in keywords:
+                self._add(''.join(keyword.split()), topic)
+        self._build()
+
+    def _add(self, keyword, topic):
+        if not keyword:
+            return
+        state = 0
+        for char in keyword:
+            if char not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(())
+                self.goto[state][char] = len(self.goto) - 1
+            state = self.goto[state][char]
+        if topic not in self.output[state]:
+            self.output[state] += (topic,)
+
+    def _build(self):
+        # 루트의 자식은 실패 시 루트로 돌아간다.
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] += tuple(
+                    topic for topic in self.output[self.fail[next_state]] if topic not in self.output[next_state]
+                )
+
+    # 메시지에 포함된 주제를 처음 등장한 순서대로 반환
+    def match(self, text):
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        found = {}
+        for char in text:
+            if char.isspace():
+                continue
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for topic in output[state]:
+                found.setdefault(topic, None)
+        return list(found)
+
+    def __bool__(self):
+        return bool(self.topics)
@@ -0,0 +1,85 @@
+# chat/management/commands/benchmark_prompts.py
+import time
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from openai import OpenAI
+from backend.upstream import get_client
+from chat.context import context_builder
+from chat.personas import load_personas
+
+
+def describe(values):
+    values = np.asarray(values, dtype=np.float64)
+    return f'avg {values.mean():.1f} / p50 {np.percentile(values, 50):.1f} / p95 {np.percentile(values, 95):.1f}'
+
+
+class Command(BaseCommand):
+    help = '전체 프롬프트와 상황 예시를 골라 붙인 프롬프트의 입력 토큰 수와 응답 지연을 비교합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--story', action='append', dest='stories', help='특정 위인 ID만 측정 (여러 번 지정 가능)')
+        parser.add_argument('--queries', help='질문 목록 파일 (한 줄에 하나, 없으면 의도 분류 학습 질문 사용)')
+        parser.add_argument('--live', type=int, default=0, help='실제 모델을 호출해 지연을 측정할 질문 수')
+        parser.add_argument('--max-tokens', type=int, default=200, help='지연 측정 시 응답 최대 토큰 수')
+
+    def handle(self, *args, **options):
+        personas = load_personas(settings.CHAT_PERSONAS_FILE)
+        personas = {story_id: persona for story_id, persona in personas.items() if persona.situations is not None}
+        if options['stories']:
+            personas = {story_id: persona for story_id, persona in personas.items() if story_id in options['stories']}
+        if not personas:
+            raise CommandError('상황 예시 색인이 있는 페르소나가 없습니다. CHAT_PROMPT_SLIMMING 설정을 확인하세요.')
+
+        file_queries = None
+        if options['queries']:
+            with open(options['queries'], encoding='utf-8') as f:
+                file_queries = [line.strip() for line in f if line.strip()]
+
+        client = OpenAI(api_key=settings.OPENAI_API_KEY, http_client=get_client('openai')) if options['live'] else None
+        counter = context_builder.counter
+
+        for story_id, persona in personas.items():
+            queries = file_queries or (persona.intents.questions if persona.intents is not None else None)
+            if not queries:
+                self.stderr.write(f'story_id {story_id}: 측정할 질문이 없습니다. --queries를 지정하세요.')
+                continue
+
+            full_tokens, slim_tokens, select_times = [], [], []
+            for query in queries:
+                user = {"role": "user", "content": query}
+                started_at = time.perf_counter()
+                prompt = persona.prompt_messages(query)
+                select_times.append((time.perf_counter() - started_at) * 1e6)
+                full_tokens.append(counter.count_messages([*persona.prefix, user]))
+                slim_tokens.append(counter.count_messages([*prompt, user]))
+
+            saved = 1 - np.mean(slim_tokens) / np.mean(full_tokens)
+            self.stdout.write(f'story_id {story_id}: 질문 {len(queries)}개')
+            self.stdout.write(f'  입력 토큰 (전체)  {describe(full_tokens)}')
+            self.stdout.write(f'  입력 토큰 (선택)  {describe(slim_tokens)}  -> {saved * 100:.1f}% 감소')
+            self.stdout.write(f'  예시 선택 시간(us) {describe(select_times)}')
+
+            if client is None:
+                continue
+
+            # 같은 질문을 두 프롬프트로 번갈아 호출하여 지연과 실제 과금 토큰 비교
+            latencies = {'full': [], 'slim': []}
+            usage = {'full': [], 'slim': []}
+            for query in queries[:options['live']]:
+                user = {"role": "user", "content": query}
+                for name, prompt in (('full', persona.prefix), ('slim', persona.prompt_messages(query))):
+                    started_at = time.perf_counter()
+                    response = client.chat.completions.create(
+                        model=persona.model,
+                        messages=[*prompt, user],
+                        max_tokens=options['max_tokens'],
+                    )
+                    latencies[name].append((time.perf_counter() - started_at) * 1000)
+                    if response.usage is not None:
+                        usage[name].append(response.usage.prompt_tokens)
+
+            for name, label in (('full', '전체'), ('slim', '선택')):
+                self.stdout.write(f'  응답 지연(ms, {label}) {describe(latencies[name])}')
+                if usage[name]:
+                    self.stdout.write(f'  과금 입력 토큰({label}) {describe(usage[name])}')
@@ -0,0 +1,68 @@
+# chat/management/commands/build_rag_indexes.py
+import json, os
+from pathlib import Path
+import faiss
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from chat.embeddings import build_embedder
+from chat.rag import MANIFEST_FILE, index_paths
+
+
+# 임시 파일에 쓴 뒤 교체하여, 실행 중인 워커가 쓰다 만 파일을 읽지 않도록 한다.
+def write_atomic(path, write):
+    tmp_path = path.with_name(path.name + '.tmp')
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+class Command(BaseCommand):
+    help = '로컬 문서 코퍼스(<CORPUS_DIR>/<story_id>/<topic>.txt)로 위인별 RAG 인덱스를 미리 만들어 저장합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--story', action='append', dest='stories', help='특정 위인 ID만 빌드 (여러 번 지정 가능)')
+        parser.add_argument('--batch-size', type=int, default=64)
+
+    def handle(self, *args, **options):
+        config = settings.CHAT_RAG
+        corpus_dir = Path(config['CORPUS_DIR'])
+        index_dir = Path(config['INDEX_DIR'])
+        if not corpus_dir.is_dir():
+            raise CommandError(f'코퍼스 디렉토리가 없습니다: {corpus_dir}')
+
+        embedder = build_embedder(config)
+        splitter = RecursiveCharacterTextSplitter(
+            chunk_size=config['CHUNK_SIZE'],
+            chunk_overlap=config['CHUNK_OVERLAP'],
+        )
+
+        story_dirs = sorted(path for path in corpus_dir.iterdir() if path.is_dir())
+        if options['stories']:
+            story_dirs = [path for path in story_dirs if path.name in options['stories']]
+
+        for story_dir in story_dirs:
+            out_dir = index_dir / story_dir.name
+            out_dir.mkdir(parents=True, exist_ok=True)
+            topics = {}
+
+            for document in sorted(story_dir.glob('*.txt')):
+                topic = document.stem
+                chunks = splitter.split_text(document.read_text(encoding='utf-8'))
+                if not chunks:
+                    continue
+
+                index = faiss.IndexFlatIP(embedder.dim)
+                batch_size = options['batch_size']
+                for start in range(0, len(chunks), batch_size):
+                    index.add(embedder.embed(chunks[start:start + batch_size]))
+
+                index_path, chunks_path = index_paths(out_dir, topic)
+                write_atomic(index_path, lambda path: faiss.write_index(index, str(path)))
+                write_atomic(chunks_path, lambda path: path.write_text(json.dumps(chunks, ensure_ascii=False), encoding='utf-8'))
+                topics[topic] = len(chunks)
+                self.stdout.write(f'story_id {story_dir.name} / {topic}: {len(chunks)}개 청크')
+
+            manifest = {'embedder': config['EMBEDDER'], 'dim': embedder.dim, 'topics': topics}
+            write_atomic(out_dir / MANIFEST_FILE, lambda path: path.write_text(json.dumps(manifest, ensure_ascii=False), encoding='utf-8'))
+
+        self.stdout.write(self.style.SUCCESS(f'{len(story_dirs)}명의 위인에 대한 RAG 인덱스를 저장했습니다: {index_dir}'))
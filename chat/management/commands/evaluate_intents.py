@@ -0,0 +1,100 @@
+# chat/management/commands/evaluate_intents.py
+import random, time
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from chat.intents import IntentMatcher
+from chat.personas import load_personas
+
+# 질문 어미를 비슷한 표현으로 바꿔 학습 질문의 변형을 만든다.
+ENDING_REWRITES = [
+    ('습니까', '나요'),
+    ('십니까', '세요'),
+    ('인가요', '입니까'),
+    ('무엇', '뭐'),
+    ('주세요', '줘'),
+    ('나요', '나'),
+    ('세요', '셔요'),
+]
+PREFIXES = ['', '장군님, ', '혹시 ', '궁금한데 ']
+
+
+def perturb(question, rng):
+    text = question
+    for source, target in ENDING_REWRITES:
+        if source in text and rng.random() < 0.5:
+            text = text.replace(source, target)
+    text = rng.choice(PREFIXES) + text
+    if rng.random() < 0.5:
+        text = text.rstrip('?!. ') if text[-1:] in '?!.' else text + '?'
+    if rng.random() < 0.5:
+        index = rng.randrange(len(text))
+        text = text.replace(' ', '') if rng.random() < 0.5 else text[:index] + ' ' + text[index:]
+    # 오타 한 글자
+    if len(text) > 6 and rng.random() < 0.3:
+        index = rng.randrange(len(text))
+        text = text[:index] + text[index + 1:]
+    return text
+
+
+class Command(BaseCommand):
+    help = '파인튜닝 JSONL로 학습한 로컬 의도 분류기의 임계값별 정밀도/재현율과 지연 시간을 측정합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--story', action='append', dest='stories', help='특정 위인 ID만 평가 (여러 번 지정 가능)')
+        parser.add_argument('--threshold', action='append', type=float, dest='thresholds', help='평가할 임계값 (여러 번 지정 가능)')
+        parser.add_argument('--variants', type=int, default=3, help='질문당 만들 변형 질문 수')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        personas = load_personas(settings.CHAT_PERSONAS_FILE)
+        personas = {story_id: persona for story_id, persona in personas.items() if persona.intents is not None}
+        if options['stories']:
+            personas = {story_id: persona for story_id, persona in personas.items() if story_id in options['stories']}
+        if not personas:
+            raise CommandError('의도 분류 데이터가 설정된 페르소나가 없습니다.')
+
+        thresholds = sorted(options['thresholds'] or [round(0.5 + 0.05 * i, 2) for i in range(10)])
+        rng = random.Random(options['seed'])
+
+        for story_id, persona in personas.items():
+            matcher = persona.intents
+            pairs = list(zip(matcher.questions, matcher.answers))
+
+            # 양성: 학습 질문의 변형은 원래 답변과 매칭되어야 한다.
+            positives = []
+            latencies = []
+            for index, question in enumerate(matcher.questions):
+                for _ in range(options['variants']):
+                    started_at = time.perf_counter()
+                    predicted, score = matcher.match(perturb(question, rng))
+                    latencies.append(time.perf_counter() - started_at)
+                    correct = predicted is not None and matcher.answers[predicted] == matcher.answers[index]
+                    positives.append((correct, score))
+
+            # 음성: 한 질문을 빼고 학습한 분류기에는 그 질문이 답할 수 없는 질문이어야 한다.
+            negatives = []
+            for index, question in enumerate(matcher.questions):
+                held_out = IntentMatcher(pairs[:index] + pairs[index + 1:], ngram_range=matcher.ngram_range)
+                predicted, score = held_out.match(question)
+                negatives.append(score if predicted is not None else 0.0)
+
+            latencies = np.array(latencies) * 1e6
+            self.stdout.write(
+                f'story_id {story_id}: 질문 {len(pairs)}개, 양성 {len(positives)}개, 음성 {len(negatives)}개, '
+                f'지연 p50 {np.percentile(latencies, 50):.0f}us / p99 {np.percentile(latencies, 99):.0f}us'
+            )
+            self.stdout.write(f'{"threshold":>9} {"precision":>9} {"recall":>7} {"answered":>8} {"fp_unseen":>9}')
+            for threshold in thresholds:
+                true_positive = sum(1 for correct, score in positives if correct and score >= threshold)
+                wrong_answer = sum(1 for correct, score in positives if not correct and score >= threshold)
+                false_accept = sum(1 for score in negatives if score >= threshold)
+                answered = true_positive + wrong_answer + false_accept
+                precision = true_positive / answered if answered else 1.0
+                recall = true_positive / len(positives) if positives else 0.0
+                marker = ' *' if threshold == matcher.threshold else ''
+                self.stdout.write(
+                    f'{threshold:>9.2f} {precision:>9.3f} {recall:>7.3f} {answered:>8} {false_accept / len(negatives):>9.3f}{marker}'
+                )
+
+        self.stdout.write(self.style.SUCCESS(f'현재 설정된 임계값: {settings.CHAT_INTENTS["THRESHOLD"]} (*)'))
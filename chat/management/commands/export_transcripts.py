@@ -0,0 +1,181 @@
+# chat/management/commands/export_transcripts.py
+import gzip, hashlib, json, math, os
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, time, timedelta, timezone
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from chat.models import ChatMessage
+from chat.ngram_index import ngram_text
+from chat.personas import load_personas
+
+# 짝을 찾지 못한 사용자 메시지를 세션별로 보관하는 최대 개수 (메모리 상한)
+MAX_PENDING_SESSIONS = 100000
+
+
+# 고정 크기 비트 배열로 중복 여부를 확인하는 블룸 필터, 테이블 크기와 무관하게 메모리가 일정하다.
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, digest):
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:16], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    # 이미 있었으면 True, 처음 보는 값이면 추가하고 False
+    def check_and_add(self, digest):
+        positions = self._positions(digest)
+        seen = all(self.bits[position >> 3] & (1 << (position & 7)) for position in positions)
+        if not seen:
+            for position in positions:
+                self.bits[position >> 3] |= 1 << (position & 7)
+        return seen
+
+
+# 공백/문장부호/대소문자 차이만 있는 질문-답변 쌍은 같은 해시가 되도록 정규화
+def pair_digest(story_id, question, answer):
+    text = f'{story_id}\x00{ngram_text(question)}\x00{ngram_text(answer)}'
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+# 기본 키 기준 키셋 페이지네이션으로 한 번에 batch_size 행만 읽는다.
+# (MySQL 드라이버는 결과 전체를 메모리에 올리므로 큰 테이블에서 iterator() 대신 사용)
+def iter_rows(queryset, batch_size):
+    last_id = 0
+    while True:
+        rows = list(
+            queryset.filter(id__gt=last_id).order_by('id')
+            .values_list('id', 'story_id', 'session_id', 'role', 'content')[:batch_size]
+        )
+        if not rows:
+            return
+        yield from rows
+        last_id = rows[-1][0]
+
+
+# 세션별로 사용자 메시지 다음에 오는 답변을 묶어 (story_id, 질문, 답변)을 만든다.
+def iter_pairs(rows):
+    pending = OrderedDict()
+    for _, story_id, session_id, role, content in rows:
+        key = (story_id, session_id)
+        if role == 'user':
+            pending[key] = content
+            pending.move_to_end(key)
+            if len(pending) > MAX_PENDING_SESSIONS:
+                pending.popitem(last=False)
+        elif role == 'assistant':
+            question = pending.pop(key, None)
+            if question is not None:
+                yield story_id, question, content
+
+
+def write_shard(path, lines):
+    tmp_path = path.with_name(path.name + '.tmp')
+    with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=6) as f:
+        f.writelines(lines)
+    os.replace(tmp_path, path)
+    return path.name, len(lines)
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f'날짜 형식은 YYYY-MM-DD 입니다: {value}')
+
+
+class Command(BaseCommand):
+    help = '저장된 대화 기록을 파인튜닝용 {"messages": [...]} gzip JSONL 샤드로 내보냅니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--story', action='append', dest='stories', help='특정 위인 ID만 내보내기 (여러 번 지정 가능)')
+        parser.add_argument('--since', help='시작 날짜 (YYYY-MM-DD, 포함)')
+        parser.add_argument('--until', help='종료 날짜 (YYYY-MM-DD, 포함)')
+        parser.add_argument('--source', action='append', dest='sources', help='답변 출처 (기본값: model)')
+        parser.add_argument('--output', default=str(settings.BASE_DIR / 'Fine-Tunning' / 'exports'))
+        parser.add_argument('--shard-size', type=int, default=50000, help='샤드당 대화 쌍 수')
+        parser.add_argument('--batch-size', type=int, default=5000, help='DB에서 한 번에 읽을 행 수')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='샤드 압축/저장 프로세스 수')
+        parser.add_argument('--expected', type=int, default=10000000, help='중복 제거용 블룸 필터 예상 쌍 수')
+        parser.add_argument('--error-rate', type=float, default=0.001)
+
+    def handle(self, *args, **options):
+        queryset = ChatMessage.objects.filter(
+            is_deleted=False,
+            source__in=options['sources'] or ['model'],
+        )
+        if options['stories']:
+            queryset = queryset.filter(story_id__in=options['stories'])
+        if options['since']:
+            queryset = queryset.filter(created_at__gte=datetime.combine(parse_date(options['since']), time.min, tzinfo=timezone.utc))
+        if options['until']:
+            until = parse_date(options['until']) + timedelta(days=1)
+            queryset = queryset.filter(created_at__lt=datetime.combine(until, time.min, tzinfo=timezone.utc))
+
+        # 학습 데이터의 system 메시지는 운영 중인 페르소나의 고정 프롬프트를 사용
+        personas = load_personas(settings.CHAT_PERSONAS_FILE)
+        system_prompts = {
+            story_id: (persona.profile + persona.instructions) if persona.situations is not None else persona.prefix[0]['content']
+            for story_id, persona in personas.items() if persona.prefix
+        }
+
+        output_dir = Path(options['output'])
+        output_dir.mkdir(parents=True, exist_ok=True)
+        prefix = datetime.now(timezone.utc).strftime('transcripts-%Y%m%d%H%M%S')
+
+        seen = BloomFilter(options['expected'], options['error_rate'])
+        exported = duplicates = 0
+        shards = []
+        lines = []
+        in_flight = set()
+
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            def flush():
+                nonlocal lines
+                if not lines:
+                    return
+                # 압축 중인 샤드 수를 워커 수로 제한하여 메모리를 일정하게 유지
+                while len(in_flight) >= options['workers']:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        in_flight.remove(future)
+                        shards.append(future.result())
+                path = output_dir / f'{prefix}-{len(shards) + len(in_flight):05d}.jsonl.gz'
+                in_flight.add(executor.submit(write_shard, path, lines))
+                lines = []
+
+            for story_id, question, answer in iter_pairs(iter_rows(queryset, options['batch_size'])):
+                if seen.check_and_add(pair_digest(story_id, question, answer)):
+                    duplicates += 1
+                    continue
+
+                messages = []
+                system_prompt = system_prompts.get(str(story_id))
+                if system_prompt:
+                    messages.append({"role": "system", "content": system_prompt})
+                messages.append({"role": "user", "content": question})
+                messages.append({"role": "assistant", "content": answer})
+                lines.append(json.dumps({"messages": messages}, ensure_ascii=False) + '\n')
+                exported += 1
+                if len(lines) >= options['shard_size']:
+                    flush()
+
+            flush()
+            for future in in_flight:
+                shards.append(future.result())
+
+        shards.sort()
+        manifest = {
+            'filters': {key: options[key] for key in ('stories', 'since', 'until', 'sources')},
+            'pairs': exported,
+            'duplicates': duplicates,
+            'shards': [{'file': name, 'pairs': count} for name, count in shards],
+        }
+        (output_dir / f'{prefix}-manifest.json').write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding='utf-8')
+        self.stdout.write(self.style.SUCCESS(
+            f'{exported}개의 대화 쌍을 {len(shards)}개 샤드로 내보냈습니다. (중복 {duplicates}개 제외): {output_dir}'
+        ))
@@ -0,0 +1,247 @@
+# chat/management/commands/loadtest_chat.py
+import asyncio, gc, json, os, platform, random, resource, subprocess, time
+from contextlib import suppress
+from datetime import datetime, timezone
+from pathlib import Path
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from backend.asgi import application
+from chat.intents import load_intent_pairs
+from chat.replay import FakeOpenAIServer, install_fake_openai, percentiles, persona_dataset
+
+
+def current_rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # /proc이 없는 환경에서는 최대 RSS로 대신한다. (Linux 기준 KB 단위)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(dirty)
+
+
+# interval마다 깨어나 예정 시각보다 늦게 실행된 만큼을 이벤트 루프 지연으로 기록
+class LoopLagMonitor:
+    def __init__(self, interval):
+        self.interval = interval
+        self.samples = []
+        self.task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+    def start(self):
+        self.task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        self.task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self.task
+
+
+class Command(BaseCommand):
+    help = 'backend.asgi.application에 다수의 WebSocket 채팅 연결을 열어 연결 지연, 메시지 왕복 지연, 연결당 메모리, 이벤트 루프 지연을 측정합니다. (가짜 OpenAI 서버 사용)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--story', default='1')
+        parser.add_argument('--dataset', help='대화 스크립트로 사용할 질문 JSONL (기본값: 페르소나의 intents 파일)')
+        parser.add_argument('--connections', type=int, default=1000, help='동시에 유지할 WebSocket 연결 수')
+        parser.add_argument('--ramp-rate', type=float, default=200, help='초당 새로 여는 연결 수')
+        parser.add_argument('--turns', type=int, default=3, help='연결당 보낼 메시지 수')
+        parser.add_argument('--think-ms', type=float, default=1000, help='메시지 사이 평균 대기 시간 (0.5~1.5배 무작위)')
+        parser.add_argument('--hold', type=float, default=0, help='대화가 끝난 뒤 연결을 유지할 시간(초)')
+        parser.add_argument('--seed', type=int, default=0, help='대기 시간 난수 시드 (같은 시드면 같은 부하)')
+        parser.add_argument('--no-stream', action='store_true', help='스트리밍 대신 전체 응답으로 요청')
+        parser.add_argument('--first-token-ms', type=float, default=300, help='가짜 서버의 첫 토큰 지연')
+        parser.add_argument('--token-ms', type=float, default=20, help='가짜 서버의 청크 간 지연')
+        parser.add_argument('--jitter', type=float, default=0.1, help='가짜 서버 지연의 흔들림 비율')
+        parser.add_argument('--lag-interval-ms', type=float, default=50, help='이벤트 루프 지연 측정 주기')
+        parser.add_argument('--timeout', type=float, default=60)
+        parser.add_argument('--output', help='결과를 저장할 JSON 경로')
+        parser.add_argument('--baseline', help='비교할 이전 결과 JSON, 회귀가 있으면 실패')
+        parser.add_argument('--max-regression', type=float, default=0.2, help='지연/메모리 지표의 허용 증가율')
+
+    def handle(self, *args, **options):
+        dataset = options['dataset'] or persona_dataset(options['story'])
+        if dataset is None:
+            raise CommandError(f"story_id {options['story']}의 대화 스크립트가 없습니다. --dataset을 지정하세요.")
+        questions = [question for question, _ in load_intent_pairs(dataset)]
+        if not questions:
+            raise CommandError(f'대화 스크립트가 비어 있습니다: {dataset}')
+
+        # 채널 레이어는 설정된 Redis를 그대로 사용하고, 부하 테스트 대화와 접속 수/방문자는 기록하지 않는다.
+        with override_settings(
+            CHAT_TRANSCRIPTS={**settings.CHAT_TRANSCRIPTS, 'ENABLED': False},
+            CHAT_ACCESS_COUNT_ENABLED=False,
+        ):
+            report = asyncio.run(self.run(questions, options))
+
+        self.print_report(report)
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+        if options['baseline']:
+            self.compare(report, json.loads(Path(options['baseline']).read_text(encoding='utf-8')), options)
+
+    async def run(self, questions, options):
+        server = FakeOpenAIServer(
+            [],
+            first_token_ms=options['first_token_ms'],
+            token_ms=options['token_ms'],
+            jitter=options['jitter'],
+        )
+        url = await server.start()
+        await install_fake_openai(url)
+
+        counts = {'connect_failed': 0, 'sent': 0, 'received': 0, 'busy': 0, 'errors': 0, 'timeouts': 0}
+        connect_latencies, round_trips = [], []
+        timeout = options['timeout']
+        path = f"/ws/chat/{options['story']}/"
+        headers = [(b'host', b'localhost'), (b'origin', b'http://localhost')]
+
+        monitor = LoopLagMonitor(options['lag_interval_ms'] / 1000)
+        monitor.start()
+        gc.collect()
+        rss_baseline = current_rss()
+        started_at = time.perf_counter()
+
+        # 1단계: ramp-rate에 맞춰 연결을 열고 인사 메시지까지 받은 시간을 연결 지연으로 기록
+        async def open_connection(index):
+            await asyncio.sleep(index / options['ramp_rate'])
+            communicator = WebsocketCommunicator(application, path, headers=headers)
+            connect_started_at = time.perf_counter()
+            try:
+                connected, _ = await communicator.connect(timeout=timeout)
+                if connected:
+                    await communicator.receive_json_from(timeout=timeout)
+            except asyncio.TimeoutError:
+                connected = False
+            if not connected:
+                counts['connect_failed'] += 1
+                return None
+            connect_latencies.append(time.perf_counter() - connect_started_at)
+            return communicator
+
+        communicators = [
+            communicator for communicator in
+            await asyncio.gather(*(open_connection(index) for index in range(options['connections'])))
+            if communicator is not None
+        ]
+        gc.collect()
+        rss_connected = current_rss()
+
+        # 2단계: 각 연결이 시드로 정해진 대기 시간을 두고 스크립트의 질문을 보낸다.
+        async def converse(index, communicator):
+            rng = random.Random(options['seed'] + index)
+            for turn in range(options['turns']):
+                await asyncio.sleep(options['think_ms'] / 1000 * rng.uniform(0.5, 1.5))
+                question = questions[(index * options['turns'] + turn) % len(questions)]
+                sent_at = time.perf_counter()
+                await communicator.send_json_to({'message': question, 'stream': not options['no_stream']})
+                counts['sent'] += 1
+                try:
+                    while True:
+                        frame = await communicator.receive_json_from(timeout=timeout)
+                        if 'delta' in frame:
+                            continue
+                        if frame.get('busy'):
+                            counts['busy'] += 1
+                        elif 'error' in frame:
+                            counts['errors'] += 1
+                        else:
+                            counts['received'] += 1
+                            round_trips.append(time.perf_counter() - sent_at)
+                        break
+                except asyncio.TimeoutError:
+                    counts['timeouts'] += 1
+                    return
+
+        await asyncio.gather(*(converse(index, communicator) for index, communicator in enumerate(communicators)))
+        rss_peak = current_rss()
+        if options['hold']:
+            await asyncio.sleep(options['hold'])
+
+        await asyncio.gather(*(communicator.disconnect() for communicator in communicators), return_exceptions=True)
+        elapsed = time.perf_counter() - started_at
+        await monitor.stop()
+        await server.stop()
+
+        commit, dirty = git_revision()
+        opened = len(communicators)
+        return {
+            'commit': commit,
+            'dirty': dirty,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'channel_layer': settings.CHANNEL_LAYERS['default']['BACKEND'],
+            'config': {
+                key: options[key] for key in (
+                    'story', 'connections', 'ramp_rate', 'turns', 'think_ms', 'hold', 'seed',
+                    'first_token_ms', 'token_ms', 'jitter',
+                )
+            } | {'stream': not options['no_stream']},
+            'elapsed_seconds': round(elapsed, 3),
+            'connections': {'opened': opened, 'failed': counts['connect_failed']},
+            'messages': {key: counts[key] for key in ('sent', 'received', 'busy', 'errors', 'timeouts')},
+            'throughput_messages_per_second': round(counts['received'] / elapsed, 2) if elapsed else None,
+            'connect_latency_ms': percentiles(connect_latencies),
+            'round_trip_ms': percentiles(round_trips),
+            'event_loop_lag_ms': percentiles(monitor.samples) | {
+                'max': round(max(monitor.samples) * 1000, 1) if monitor.samples else None,
+            },
+            # 클라이언트도 같은 프로세스에서 동작하므로 연결당 메모리는 서버+클라이언트의 상한값이다.
+            'memory': {
+                'baseline_mb': round(rss_baseline / 2 ** 20, 1),
+                'connected_mb': round(rss_connected / 2 ** 20, 1),
+                'peak_mb': round(rss_peak / 2 ** 20, 1),
+                'per_connection_kb': round((rss_connected - rss_baseline) / opened / 1024, 1) if opened else None,
+            },
+            'upstream_requests': server.requests,
+        }
+
+    def print_report(self, report):
+        connections, messages = report['connections'], report['messages']
+        self.stdout.write(
+            f"commit {report['commit']}{' (dirty)' if report['dirty'] else ''}, {report['channel_layer']}, {report['elapsed_seconds']}초"
+        )
+        self.stdout.write(f"  연결 {connections['opened']}개 (실패 {connections['failed']}개)")
+        self.stdout.write(
+            f"  메시지 {messages['sent']}개 전송, {messages['received']}개 응답 "
+            f"(busy {messages['busy']}, 오류 {messages['errors']}, 시간 초과 {messages['timeouts']}), "
+            f"{report['throughput_messages_per_second']} msg/s"
+        )
+        for key, label in (('connect_latency_ms', '연결 지연'), ('round_trip_ms', '왕복 지연'), ('event_loop_lag_ms', '이벤트 루프 지연')):
+            values = report[key]
+            self.stdout.write(f"  {label}(ms) p50 {values['p50']} / p95 {values['p95']} / p99 {values['p99']}")
+        memory = report['memory']
+        self.stdout.write(
+            f"  메모리 {memory['baseline_mb']}MB -> {memory['connected_mb']}MB (최대 {memory['peak_mb']}MB), "
+            f"연결당 {memory['per_connection_kb']}KB"
+        )
+
+    # 이전 커밋의 결과보다 지표가 max_regression 이상 나빠지면 실패
+    def compare(self, report, baseline, options):
+        failures = []
+        for key, field in (('connect_latency_ms', 'p95'), ('round_trip_ms', 'p95'), ('event_loop_lag_ms', 'p99'), ('memory', 'per_connection_kb')):
+            current, previous = report[key][field], baseline.get(key, {}).get(field)
+            if current is not None and previous and current > previous * (1 + options['max_regression']):
+                failures.append(f'{key} {field} {previous} -> {current}')
+        for key in ('errors', 'timeouts'):
+            if report['messages'][key] > baseline.get('messages', {}).get(key, 0):
+                failures.append(f"{key} {baseline.get('messages', {}).get(key, 0)} -> {report['messages'][key]}")
+        if failures:
+            raise CommandError(f"{baseline.get('commit')} 대비 회귀가 발생했습니다: " + ', '.join(failures))
+        self.stdout.write(self.style.SUCCESS(f"{baseline.get('commit')} 대비 회귀가 없습니다."))
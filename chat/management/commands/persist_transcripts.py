@@ -0,0 +1,115 @@
+# chat/management/commands/persist_transcripts.py
+import logging, os, signal, socket, time
+from datetime import datetime, timezone
+import redis
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections, transaction
+from django_redis import get_redis_connection
+from chat.metrics import TRANSCRIPT_EVENTS
+from chat.models import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+
+def to_chat_message(entry_id, fields):
+    fields = {key.decode(): value.decode() for key, value in fields.items()}
+    return ChatMessage(
+        event_id=entry_id.decode(),
+        story_id=int(fields['story_id']),
+        session_id=fields['session_id'][:64],
+        role=fields['role'][:16],
+        content=fields['content'],
+        source=fields.get('source', '')[:16],
+        created_at=datetime.fromtimestamp(float(fields['created_at']), tz=timezone.utc),
+    )
+
+
+class Command(BaseCommand):
+    help = 'Redis 스트림에 쌓인 대화 기록을 consumer group으로 읽어 ChatMessage 테이블에 일괄 저장합니다. (at-least-once)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consumer', help='consumer 이름 (기본값: 호스트명-PID)')
+        parser.add_argument('--once', action='store_true', help='쌓여 있는 항목만 처리하고 종료')
+
+    def handle(self, *args, **options):
+        config = settings.CHAT_TRANSCRIPTS
+        self.stream = config['STREAM']
+        self.group = config['GROUP']
+        self.consumer = options['consumer'] or f'{socket.gethostname()}-{os.getpid()}'
+        self.redis = get_redis_connection("default")
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        try:
+            self.redis.xgroup_create(self.stream, self.group, id='0', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+        self.stdout.write(f'{self.stream} 스트림을 {self.group}/{self.consumer}로 처리합니다.')
+        # 재시작 직후에는 이전에 받아두고 ACK하지 못한 항목부터 다시 처리
+        read_id = '0'
+        while not self.stopping:
+            entries = self.claim_stale(config)
+            if not entries:
+                block = None if read_id == '0' or options['once'] else config['BLOCK_MS']
+                response = self.redis.xreadgroup(
+                    self.group, self.consumer, {self.stream: read_id},
+                    count=config['BATCH_SIZE'], block=block,
+                )
+                entries = response[0][1] if response else []
+                if read_id == '0' and not entries:
+                    read_id = '>'
+                    continue
+            if not entries:
+                if options['once']:
+                    break
+                continue
+
+            try:
+                self.persist(entries)
+            except DatabaseError as e:
+                # ACK하지 않은 항목은 pending으로 남아 다시 처리된다.
+                logger.error(f'Failed to persist {len(entries)} transcript entries: {str(e)}')
+                read_id = '0'
+                time.sleep(config['RETRY_DELAY'])
+
+        self.stdout.write(self.style.SUCCESS('대화 기록 저장 워커를 종료합니다.'))
+
+    def stop(self, signum, frame):
+        self.stopping = True
+
+    # 오래 ACK되지 않은 다른(종료된) 워커의 항목을 가져온다.
+    def claim_stale(self, config):
+        response = self.redis.xautoclaim(
+            self.stream, self.group, self.consumer,
+            min_idle_time=config['CLAIM_IDLE_MS'], start_id='0-0', count=config['BATCH_SIZE'],
+        )
+        return [entry for entry in response[1] if entry[1]]
+
+    def persist(self, entries):
+        messages, entry_ids = [], []
+        for entry_id, fields in entries:
+            entry_ids.append(entry_id)
+            if not fields:
+                continue
+            try:
+                messages.append(to_chat_message(entry_id, fields))
+            except (KeyError, ValueError, UnicodeDecodeError) as e:
+                # 형식이 잘못된 항목은 재시도해도 실패하므로 건너뛴다.
+                logger.error(f'Skipping malformed transcript entry {entry_id}: {str(e)}')
+
+        close_old_connections()
+        with transaction.atomic():
+            # 같은 항목이 다시 전달되어도 event_id unique 제약으로 한 번만 저장
+            ChatMessage.objects.bulk_create(messages, ignore_conflicts=True)
+
+        # DB 저장이 끝난 뒤에만 ACK하고 스트림에서 제거
+        with self.redis.pipeline(transaction=False) as pipe:
+            pipe.xack(self.stream, self.group, *entry_ids)
+            pipe.xdel(self.stream, *entry_ids)
+            pipe.execute()
+        TRANSCRIPT_EVENTS.labels('persisted').inc(len(messages))
+        logger.info(f'Persisted {len(messages)} transcript messages')
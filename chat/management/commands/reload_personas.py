@@ -0,0 +1,19 @@
+# chat/management/commands/reload_personas.py
+import redis
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from chat.personas import load_personas
+
+
+class Command(BaseCommand):
+    help = '페르소나 파일을 검증하고 버전 키를 올려 모든 워커가 다시 로드하도록 합니다.'
+
+    def handle(self, *args, **options):
+        try:
+            personas = load_personas(settings.CHAT_PERSONAS_FILE)
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f'페르소나 파일을 불러올 수 없습니다: {str(e)}')
+
+        redis_conn = redis.Redis.from_url(settings.CHAT_REDIS_URL)
+        version = redis_conn.incr(settings.CHAT_PERSONA_VERSION_KEY)
+        self.stdout.write(self.style.SUCCESS(f'{len(personas)}개의 페르소나, 버전 {version}으로 갱신되었습니다.'))
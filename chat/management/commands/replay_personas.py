@@ -0,0 +1,186 @@
+# chat/management/commands/replay_personas.py
+import asyncio, json, time
+from pathlib import Path
+import numpy as np
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from chat.intents import load_intent_pairs
+from chat.ngram_index import CharNgramIndex
+from chat.replay import (
+    FakeOpenAIServer, ReplayEnvironmentError, install_fake_openai, load_cached_encoding, percentiles, persona_dataset, use_local_state,
+)
+from chat.routing import websocket_urlpatterns
+
+
+class Command(BaseCommand):
+    help = '파인튜닝 JSONL의 사용자 질문을 실제 ChatConsumer로 재생하여 지연, 첫 토큰 시간, 처리량, 기준 답변 유사도를 측정합니다. (가짜 OpenAI 서버 사용)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--story', default='1')
+        parser.add_argument('--dataset', help='질문/기준 답변 JSONL (기본값: 페르소나의 intents 파일)')
+        parser.add_argument('--sessions', type=int, default=20, help='재생할 WebSocket 세션 수')
+        parser.add_argument('--concurrency', type=int, default=10, help='동시에 열어둘 세션 수')
+        parser.add_argument('--turns', type=int, default=5, help='세션당 대화 턴 수')
+        parser.add_argument('--no-stream', action='store_true', help='스트리밍 대신 전체 응답으로 요청')
+        parser.add_argument('--first-token-ms', type=float, default=300, help='가짜 서버의 첫 토큰 지연')
+        parser.add_argument('--token-ms', type=float, default=20, help='가짜 서버의 청크 간 지연')
+        parser.add_argument('--jitter', type=float, default=0.1, help='가짜 서버 지연의 흔들림 비율')
+        parser.add_argument('--with-intents', action='store_true', help='로컬 의도 분류기 응답도 포함 (기본값: 모든 턴을 모델 경로로)')
+        parser.add_argument('--with-cache', action='store_true', help='의미 기반 응답 캐시 사용')
+        parser.add_argument('--with-rag', action='store_true', help='RAG 검색 사용')
+        parser.add_argument('--timeout', type=float, default=60)
+        parser.add_argument('--json', help='결과를 저장할 JSON 경로')
+        parser.add_argument('--baseline', help='비교할 이전 결과 JSON, 회귀가 있으면 실패')
+        parser.add_argument('--max-regression', type=float, default=0.2, help='p95 지연/첫 토큰 시간 허용 증가율')
+        parser.add_argument('--max-similarity-drop', type=float, default=0.02, help='평균 유사도 허용 감소폭')
+
+    def handle(self, *args, **options):
+        dataset = options['dataset'] or persona_dataset(options['story'])
+        if dataset is None:
+            raise CommandError(f"story_id {options['story']}의 기준 데이터가 없습니다. --dataset을 지정하세요.")
+        pairs = load_intent_pairs(dataset)
+        if not pairs:
+            raise CommandError(f'기준 데이터가 비어 있습니다: {dataset}')
+
+        # Redis나 네트워크 없이 재생: 채널 레이어, 대화 기록, 페르소나는 프로세스 내부용으로 두고
+        # 대화 기록은 스트림에 쌓지 않으며 접속 수/방문자도 집계하지 않는다.
+        try:
+            load_cached_encoding()
+        except ReplayEnvironmentError as e:
+            raise CommandError(str(e))
+        use_local_state()
+        with override_settings(
+            CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+            CHAT_TRANSCRIPTS={**settings.CHAT_TRANSCRIPTS, 'ENABLED': False},
+            CHAT_ACCESS_COUNT_ENABLED=False,
+        ):
+            report = asyncio.run(self.replay(pairs, options))
+
+        self.print_report(report)
+        if options['json']:
+            Path(options['json']).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+        if options['baseline']:
+            self.compare(report, json.loads(Path(options['baseline']).read_text(encoding='utf-8')), options)
+
+    async def replay(self, pairs, options):
+        server = FakeOpenAIServer(
+            pairs,
+            first_token_ms=options['first_token_ms'],
+            token_ms=options['token_ms'],
+            jitter=options['jitter'],
+        )
+        url = await server.start()
+
+        await install_fake_openai(url, intents=options['with_intents'], cache=options['with_cache'], rag=options['with_rag'])
+
+        application = URLRouter(websocket_urlpatterns)
+        semaphore = asyncio.Semaphore(options['concurrency'])
+        turns = []
+
+        async def run_session(index):
+            start = index * options['turns']
+            script = [pairs[(start + i) % len(pairs)] for i in range(options['turns'])]
+            async with semaphore:
+                communicator = WebsocketCommunicator(application, f"/ws/chat/{options['story']}/")
+                connected, _ = await communicator.connect(timeout=options['timeout'])
+                if not connected:
+                    turns.append({'error': 'connect'})
+                    return
+                await communicator.receive_json_from(timeout=options['timeout'])  # 인사 메시지
+                try:
+                    for question, reference in script:
+                        turns.append(await self.run_turn(communicator, question, reference, options))
+                finally:
+                    await communicator.disconnect()
+
+        started_at = time.perf_counter()
+        try:
+            await asyncio.gather(*(run_session(index) for index in range(options['sessions'])))
+        finally:
+            await server.stop()
+        elapsed = time.perf_counter() - started_at
+
+        completed = [turn for turn in turns if 'answer' in turn]
+        references = sorted({turn['reference'] for turn in completed})
+        similarities = []
+        if references:
+            index = CharNgramIndex(references)
+            positions = {reference: position for position, reference in enumerate(references)}
+            for turn in completed:
+                scores = index.scores(turn['answer'])
+                similarities.append(float(scores[positions[turn['reference']]]) if scores is not None else 0.0)
+
+        return {
+            'story_id': options['story'],
+            'sessions': options['sessions'],
+            'concurrency': options['concurrency'],
+            'stream': not options['no_stream'],
+            'fake_server': {'first_token_ms': options['first_token_ms'], 'token_ms': options['token_ms'], 'jitter': options['jitter']},
+            'turns': len(completed),
+            'busy': sum(1 for turn in turns if turn.get('busy')),
+            'errors': sum(1 for turn in turns if 'error' in turn),
+            'elapsed_seconds': round(elapsed, 3),
+            'throughput_turns_per_second': round(len(completed) / elapsed, 2) if elapsed else None,
+            'latency_ms': percentiles([turn['latency'] for turn in completed]),
+            'time_to_first_token_ms': percentiles([turn['first_token'] for turn in completed]),
+            'similarity': {
+                'mean': round(float(np.mean(similarities)), 4) if similarities else None,
+                'p10': round(float(np.percentile(similarities, 10)), 4) if similarities else None,
+                'exact': round(sum(1 for turn in completed if turn['answer'] == turn['reference']) / len(completed), 4) if completed else None,
+            },
+            'upstream_requests': server.requests,
+            'avg_prompt_chars': round(server.prompt_chars / server.requests, 1) if server.requests else None,
+        }
+
+    async def run_turn(self, communicator, question, reference, options):
+        started_at = time.perf_counter()
+        first_token_at = None
+        await communicator.send_json_to({'message': question, 'stream': not options['no_stream']})
+        while True:
+            frame = await communicator.receive_json_from(timeout=options['timeout'])
+            if 'delta' in frame:
+                first_token_at = first_token_at or time.perf_counter()
+                continue
+            if frame.get('busy'):
+                return {'busy': True}
+            if 'error' in frame:
+                return {'error': frame['error']}
+            if 'message' in frame:
+                finished_at = time.perf_counter()
+                return {
+                    'latency': finished_at - started_at,
+                    'first_token': (first_token_at or finished_at) - started_at,
+                    'answer': frame['message'],
+                    'reference': reference,
+                }
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"story_id {report['story_id']}: 턴 {report['turns']}개 (busy {report['busy']}, 오류 {report['errors']}), "
+            f"{report['elapsed_seconds']}초, {report['throughput_turns_per_second']} turns/s"
+        )
+        for key, label in (('latency_ms', '응답 지연'), ('time_to_first_token_ms', '첫 토큰')):
+            values = report[key]
+            self.stdout.write(f"  {label}(ms) p50 {values['p50']} / p95 {values['p95']} / p99 {values['p99']}")
+        similarity = report['similarity']
+        self.stdout.write(f"  기준 답변 유사도 평균 {similarity['mean']} / p10 {similarity['p10']} / 일치율 {similarity['exact']}")
+        self.stdout.write(f"  모델 호출 {report['upstream_requests']}회, 평균 프롬프트 {report['avg_prompt_chars']}자")
+
+    # 이전 결과보다 지연이 max_regression 이상 늘거나 유사도가 떨어지면 실패 (CI 회귀 검사용)
+    def compare(self, report, baseline, options):
+        failures = []
+        for key in ('latency_ms', 'time_to_first_token_ms'):
+            current, previous = report[key]['p95'], baseline.get(key, {}).get('p95')
+            if current is not None and previous and current > previous * (1 + options['max_regression']):
+                failures.append(f'{key} p95 {previous} -> {current}')
+        current, previous = report['similarity']['mean'], baseline.get('similarity', {}).get('mean')
+        if current is not None and previous is not None and current < previous - options['max_similarity_drop']:
+            failures.append(f'similarity mean {previous} -> {current}')
+        if report['errors']:
+            failures.append(f"errors {report['errors']}")
+        if failures:
+            raise CommandError('기준 대비 회귀가 발생했습니다: ' + ', '.join(failures))
+        self.stdout.write(self.style.SUCCESS('기준 결과 대비 회귀가 없습니다.'))
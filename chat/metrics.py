@@ -0,0 +1,78 @@
+# chat/metrics.py
+from prometheus_client import Counter, Gauge, Histogram
+
+# 스트리밍 응답에서 첫 토큰이 도착하기까지 걸린 시간
+GPT_TIME_TO_FIRST_TOKEN = Histogram(
+    'chat_gpt_time_to_first_token_seconds',
+    'Time from the completion request until the first streamed token arrives',
+    ['story_id'],
+    buckets=(0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0),
+)
+
+# Redis에 남아 있는 전체 세션의 대화 기록 크기 (연결이 끊겨 TTL까지 남은 세션 포함)
+# 합계는 Redis에 두고 각 프로세스는 마지막으로 기록을 쓸 때 본 값을 내보내므로, 프로세스 간에는 max로 집계한다.
+CHAT_HISTORY_BYTES = Gauge(
+    'chat_history_bytes',
+    'Total bytes of chat history stored in Redis across all sessions until TTL, as of the last history write by this process',
+)
+
+# 의미 기반 응답 캐시 적중/실패 수
+SEMANTIC_CACHE_REQUESTS = Counter(
+    'chat_semantic_cache_requests_total',
+    'Semantic response cache lookups by result (hit, miss, error)',
+    ['story_id', 'result'],
+)
+
+# 로컬 의도 분류기로 모델 호출 없이 답한 요청 수
+INTENT_MATCHES = Counter(
+    'chat_intent_matches_total',
+    'Local intent matcher lookups by result',
+    ['story_id', 'result'],
+)
+
+# 클라이언트가 보낸 음성 바이트 수와 STT 업로드 전 정규화로 줄어든 바이트 수
+STT_AUDIO_BYTES_RECEIVED = Counter(
+    'chat_stt_audio_bytes_received_total',
+    'Voice message bytes received from clients',
+)
+STT_AUDIO_BYTES_SAVED = Counter(
+    'chat_stt_audio_bytes_saved_total',
+    'Voice message bytes removed by normalization before the STT upload',
+)
+
+# 동일 요청 합치기(single-flight) 역할별 요청 수와 합쳐진 비율
+SINGLEFLIGHT_REQUESTS = Counter(
+    'chat_singleflight_requests_total',
+    'Completion requests by single-flight role',
+    ['role'],
+)
+SINGLEFLIGHT_COALESCING_RATIO = Gauge(
+    'chat_singleflight_coalescing_ratio',
+    'Share of completion requests on this process served by another in-flight call',
+)
+
+# OpenAI 호출 스케줄러 대기열 길이, 대기 시간, 거절/재시도 수
+UPSTREAM_QUEUE_DEPTH = Gauge(
+    'chat_upstream_queue_depth',
+    'Completion requests waiting for an upstream slot on this process',
+)
+UPSTREAM_WAIT_SECONDS = Histogram(
+    'chat_upstream_wait_seconds',
+    'Time a completion request waited for admission',
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0),
+)
+UPSTREAM_REJECTED = Counter(
+    'chat_upstream_rejected_total',
+    'Completion requests rejected because the wait queue was full or the wait timed out',
+)
+UPSTREAM_RETRIES = Counter(
+    'chat_upstream_retries_total',
+    'Completion requests retried after a transient error (connection error, timeout, 429, 5xx)',
+)
+
+# 대화 기록 스트림에 추가/저장/유실된 메시지 수
+TRANSCRIPT_EVENTS = Counter(
+    'chat_transcript_events_total',
+    'Chat transcript messages by pipeline stage',
+    ['stage'],
+)
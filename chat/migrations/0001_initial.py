@@ -0,0 +1,35 @@
+# Generated by Django 5.0.6 on 2026-10-17 06:31
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('story', '0013_remove_story_silhouette_url'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatMessage',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('event_id', models.CharField(max_length=32, unique=True)),
+                ('session_id', models.CharField(db_index=True, max_length=64)),
+                ('role', models.CharField(max_length=16)),
+                ('content', models.TextField()),
+                ('source', models.CharField(blank=True, max_length=16)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('story', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='story.story')),
+            ],
+            options={
+                'db_table': 'ChatMessage',
+                'indexes': [models.Index(fields=['story', 'created_at'], name='ChatMessage_story_i_6ece39_idx')],
+            },
+        ),
+    ]
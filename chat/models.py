@@ -0,0 +1,25 @@
+from django.db import models
+from django.utils import timezone
+from story.models import Story
+
+# Create your models here.
+# Redis 스트림을 거쳐 persist_transcripts 워커가 일괄 저장하는 대화 기록
+class ChatMessage(models.Model):
+    id = models.BigAutoField(primary_key=True)
+    # 스트림 항목 ID, 같은 항목이 다시 전달되어도 한 번만 저장되도록 unique
+    event_id = models.CharField(max_length=32, unique=True)
+    # 잘못된 story_id 하나로 배치 전체가 실패하지 않도록 DB 제약은 두지 않는다.
+    story = models.ForeignKey(Story, on_delete=models.DO_NOTHING, db_constraint=False)
+    session_id = models.CharField(max_length=64, db_index=True)
+    role = models.CharField(max_length=16)
+    content = models.TextField()
+    # 답변 출처 (model, intent, cache, fallback)
+    source = models.CharField(max_length=16, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    is_deleted = models.BooleanField(default=False)
+
+    class Meta:
+        db_table = 'ChatMessage'
+        indexes = [
+            models.Index(fields=['story', 'created_at']),
+        ]
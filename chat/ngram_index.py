@@ -0,0 +1,81 @@
+# chat/ngram_index.py
+import math
+from collections import Counter
+import numpy as np
+from .embeddings import normalize_text
+
+
+# 공백과 문장부호를 제외한 문자만 남겨 띄어쓰기/물음표 차이에 영향을 받지 않도록 한다.
+def ngram_text(text):
+    return ''.join(char for char in normalize_text(text) if char.isalnum())
+
+
+def char_ngrams(text, ngram_range):
+    text = ngram_text(text)
+    grams = Counter()
+    for n in range(ngram_range[0], ngram_range[1] + 1):
+        for i in range(len(text) - n + 1):
+            grams[text[i:i + n]] += 1
+    return grams
+
+
+# 문자 n-gram TF-IDF 인덱스
+# n-gram별 행에 정규화된 문서 가중치를 저장해두고, 질의에 등장한 n-gram 행만 모아 한 번의 행렬곱으로 점수를 계산한다.
+class CharNgramIndex:
+    def __init__(self, texts, ngram_range=(1, 3)):
+        self.ngram_range = tuple(ngram_range)
+        self.size = len(texts)
+
+        documents = [char_ngrams(text, self.ngram_range) for text in texts]
+        self.vocabulary = {}
+        for grams in documents:
+            for gram in grams:
+                self.vocabulary.setdefault(gram, len(self.vocabulary))
+
+        document_frequency = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for grams in documents:
+            document_frequency[[self.vocabulary[gram] for gram in grams]] += 1
+        self.idf = np.log((1 + self.size) / (1 + document_frequency)) + 1
+        # 학습에 없던 n-gram은 최대 IDF를 가진 것으로 본다.
+        self.unseen_idf = math.log(1 + self.size) + 1
+
+        weights = np.zeros((len(self.vocabulary), self.size), dtype=np.float32)
+        for column, grams in enumerate(documents):
+            for gram, count in grams.items():
+                row = self.vocabulary[gram]
+                weights[row, column] = (1 + math.log(count)) * self.idf[row]
+        norms = np.linalg.norm(weights, axis=0)
+        norms[norms == 0] = 1.0
+        self.weights = weights / norms
+
+    def __len__(self):
+        return self.size
+
+    # 모든 문서와의 코사인 유사도, 겹치는 n-gram이 없으면 None
+    def scores(self, text):
+        rows, values = [], []
+        unseen = 0.0
+        for gram, count in char_ngrams(text, self.ngram_range).items():
+            row = self.vocabulary.get(gram)
+            if row is None:
+                unseen += ((1 + math.log(count)) * self.unseen_idf) ** 2
+            else:
+                rows.append(row)
+                values.append((1 + math.log(count)) * self.idf[row])
+        if not rows:
+            return None
+
+        values = np.asarray(values, dtype=np.float32)
+        # 질의 벡터의 노름은 학습에 없던 n-gram까지 포함해서 계산해야 유사도가 과대평가되지 않는다.
+        norm = math.sqrt(float(values @ values) + unseen)
+        return (values @ self.weights[rows]) / norm
+
+    # 유사도 상위 k개의 (인덱스, 점수)를 점수 순으로 반환
+    def search(self, text, k=1, min_score=0.0):
+        scores = self.scores(text)
+        if scores is None:
+            return []
+        k = min(k, self.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(index), float(scores[index])) for index in top if scores[index] >= min_score]
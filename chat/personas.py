@@ -0,0 +1,149 @@
+# chat/personas.py
+import asyncio, json, logging, time
+from dataclasses import dataclass, field
+from django.conf import settings
+from .history import get_redis
+from .intents import load_intent_matcher
+from .keyword_router import KeywordRouter
+from .situations import SituationIndex
+from .streaming import ReplacementRules
+
+logger = logging.getLogger(__name__)
+
+
+# 프로세스당 한 번 컴파일되어 모든 요청이 공유하는 위인 페르소나
+@dataclass(frozen=True)
+class Persona:
+    story_id: str
+    name: str
+    greeting: str
+    model: str
+    prefix: tuple
+    rules: ReplacementRules
+    router: KeywordRouter
+    rag_instruction: str
+    intents: object
+    profile: str
+    instructions: str
+    situations: SituationIndex
+    fallback: str
+    # 선택된 상황 예시 조합(위치 tuple)별로 한 번만 만든 system 메시지
+    system_messages: dict = field(default_factory=dict, compare=False, repr=False)
+
+    # 고정 프롬프트(프로필/지시사항) 사이에 현재 메시지와 관련된 상황 예시만 넣는다.
+    # 조합 수는 상황 예시 수와 TOP_K로 제한되므로 메시지마다 문자열/딕셔너리를 새로 만들지 않고 재사용한다.
+    def prompt_messages(self, user_message):
+        if self.situations is None:
+            return self.prefix
+        selected = self.situations.select_indexes(user_message)
+        messages = self.system_messages.get(selected)
+        if messages is None:
+            content = self.profile + ''.join(self.situations.situations[index] for index in selected) + self.instructions
+            messages = self.system_messages.setdefault(selected, ({"role": "system", "content": content},))
+        return messages
+
+
+def compile_persona(story_id, data):
+    prompt = data.get('prompt') or {}
+    profile = ''.join(prompt.get('profile', []))
+    instructions = ''.join(prompt.get('instructions', []))
+    system_prompt = profile + ''.join(prompt.get('situations', [])) + instructions
+    # 요청마다 앞에 붙는 메시지는 미리 만들어두고 재사용
+    prefix = ({"role": "system", "content": system_prompt},) if system_prompt else ()
+    rag = data.get('rag') or {}
+
+    # 상황별 예시는 색인해두고 요청마다 관련된 것만 프롬프트에 붙인다.
+    situations = None
+    if settings.CHAT_PROMPT_SLIMMING['ENABLED'] and prompt.get('situations'):
+        situations = SituationIndex(
+            prompt['situations'],
+            top_k=settings.CHAT_PROMPT_SLIMMING['TOP_K'],
+            min_score=settings.CHAT_PROMPT_SLIMMING['MIN_SCORE'],
+        )
+
+    # 파인튜닝 데이터의 고정 질문/답변으로 로컬 의도 분류기 학습 (경로는 BASE_DIR 기준)
+    intents = None
+    if settings.CHAT_INTENTS['ENABLED'] and data.get('intents'):
+        intents = load_intent_matcher(
+            settings.BASE_DIR / data['intents'],
+            threshold=settings.CHAT_INTENTS['THRESHOLD'],
+            ngram_range=settings.CHAT_INTENTS['NGRAM_RANGE'],
+        )
+
+    return Persona(
+        story_id=story_id,
+        name=data.get('name', ''),
+        greeting=data['greeting'],
+        model=data.get('model'),
+        prefix=prefix,
+        rules=ReplacementRules(data.get('replacements')),
+        # RAG 주제 선택용 키워드 매처도 페르소나와 함께 한 번만 컴파일
+        router=KeywordRouter((rag.get('topics') or {}).items()),
+        rag_instruction=rag.get('instruction', ''),
+        intents=intents,
+        profile=profile,
+        instructions=instructions,
+        situations=situations,
+        # 외부 API 장애로 답변할 수 없을 때 보낼 페르소나 말투의 안내 문구
+        fallback=data.get('fallback') or settings.CHAT_FALLBACK_MESSAGE,
+    )
+
+
+def load_personas(path):
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    return {str(story_id): compile_persona(str(story_id), item) for story_id, item in data.items()}
+
+
+# 페르소나 파일을 로드/컴파일하고, Redis의 버전 키가 바뀌면 다시 로드하는 레지스트리
+# migrate, celery 등 채팅과 관계없는 프로세스에서는 읽지 않도록 첫 get()(또는 ASGI 시작 시 warm_up)에서 로드한다.
+class PersonaRegistry:
+    def __init__(self, path, version_key, check_interval):
+        self.path = path
+        self.version_key = version_key
+        self.check_interval = check_interval
+        self.personas = None
+        self.version = None
+        self.checked_at = 0.0
+
+    def load(self, version=None):
+        self.personas = load_personas(self.path)
+        self.version = version
+        logger.info(f'Loaded {len(self.personas)} personas (version {version})')
+
+    async def refresh(self):
+        now = time.monotonic()
+        if self.personas is not None and now - self.checked_at < self.check_interval:
+            return
+        self.checked_at = now
+
+        try:
+            version = await get_redis().get(self.version_key)
+        except Exception as e:
+            logger.error(f'Failed to read persona version from Redis: {str(e)}')
+            version = self.version
+
+        if self.personas is None or version != self.version:
+            try:
+                await asyncio.to_thread(self.load, version)
+            except Exception as e:
+                # 잘못된 파일이면 이전 페르소나를 유지하고 다음 확인 때 다시 시도
+                logger.error(f'Failed to load personas from {self.path}: {str(e)}')
+
+    # ASGI 서버 시작 시 백그라운드 스레드에서 미리 로드 (실패하면 첫 요청 때 다시 시도)
+    def warm_up(self):
+        try:
+            self.load()
+        except Exception as e:
+            logger.error(f'Failed to load personas from {self.path}: {str(e)}')
+
+    async def get(self, story_id):
+        await self.refresh()
+        return (self.personas or {}).get(str(story_id))
+
+
+registry = PersonaRegistry(
+    settings.CHAT_PERSONAS_FILE,
+    settings.CHAT_PERSONA_VERSION_KEY,
+    settings.CHAT_PERSONA_RELOAD_INTERVAL,
+)
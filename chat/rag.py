@@ -0,0 +1,106 @@
+# chat/rag.py
+import asyncio, json, logging, threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import faiss
+from django.conf import settings
+from .embeddings import build_embedder
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = 'manifest.json'
+
+
+def index_paths(story_dir, topic):
+    return story_dir / f'{topic}.faiss', story_dir / f'{topic}.json'
+
+
+# build_rag_indexes 명령으로 미리 만들어둔 위인별 FAISS 인덱스를 프로세스당 한 번만 읽어 연결 간에 공유한다.
+# 검색은 전용 스레드 풀에서 실행하여 이벤트 루프를 막지 않는다.
+# RAG는 부가 맥락이므로 인덱스를 읽지 못하거나 검색에 실패하면 로그만 남기고 RAG 없이 대화를 계속한다.
+class RagIndexStore:
+    def __init__(self, index_dir, embedder, embedder_path, top_k, workers):
+        self.index_dir = Path(index_dir)
+        self.embedder = embedder
+        self.embedder_path = embedder_path
+        self.top_k = top_k
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='rag')
+        self.indexes = {}
+        self.lock = threading.Lock()
+
+    def _read(self, story_id):
+        story_dir = self.index_dir / story_id
+        manifest_path = story_dir / MANIFEST_FILE
+        if not manifest_path.exists():
+            return {}
+
+        try:
+            with open(manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f'Failed to read RAG manifest for story_id {story_id}: {str(e)}')
+            return {}
+        if manifest.get('embedder') != self.embedder_path:
+            logger.error(f"RAG index for story_id {story_id} was built with {manifest.get('embedder')}, expected {self.embedder_path}")
+            return {}
+        # 임베더 설정(모델/차원)이 바뀐 인덱스는 검색 시 FAISS 오류가 나므로 사용하지 않는다.
+        if manifest.get('dim') != self.embedder.dim:
+            logger.error(f"RAG index for story_id {story_id} has dim {manifest.get('dim')}, embedder dim is {self.embedder.dim}; disabled")
+            return {}
+
+        indexes = {}
+        for topic in manifest.get('topics', {}):
+            index_path, chunks_path = index_paths(story_dir, topic)
+            try:
+                # build_rag_indexes가 만드는 IndexFlatIP는 메모리 맵을 지원하지 않으므로 프로세스마다 전체가 메모리로 읽힌다.
+                index = faiss.read_index(str(index_path), faiss.IO_FLAG_READ_ONLY)
+                with open(chunks_path, encoding='utf-8') as f:
+                    chunks = json.load(f)
+            except (OSError, ValueError, RuntimeError) as e:
+                logger.error(f'Failed to read RAG index {story_id}/{topic}: {str(e)}')
+                continue
+            if index.d != self.embedder.dim or index.ntotal != len(chunks):
+                logger.error(f'RAG index {story_id}/{topic} does not match its chunks or the embedder dim; skipped')
+                continue
+            indexes[topic] = (index, chunks)
+
+        logger.info(f'Loaded {len(indexes)} RAG indexes for story_id {story_id}')
+        return indexes
+
+    def _load(self, story_id):
+        with self.lock:
+            if story_id not in self.indexes:
+                self.indexes[story_id] = self._read(story_id)
+            return self.indexes[story_id]
+
+    def _search(self, story_id, topics, query):
+        indexes = self._load(story_id)
+        selected = [indexes[topic] for topic in topics if topic in indexes]
+        if not selected:
+            return []
+
+        vector = self.embedder.embed([query])
+        documents = []
+        for index, chunks in selected:
+            _, ids = index.search(vector, min(self.top_k, index.ntotal))
+            documents.extend(chunks[i] for i in ids[0] if i >= 0)
+
+        # 중복된 문서 제거
+        return list(dict.fromkeys(documents))
+
+    async def retrieve(self, story_id, topics, query):
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.executor, self._search, story_id, topics, query)
+        except Exception as e:
+            logger.error(f'RAG retrieval failed (Story ID {story_id}), continuing without context: {str(e)}')
+            return []
+
+
+rag_store = RagIndexStore(
+    settings.CHAT_RAG['INDEX_DIR'],
+    build_embedder(settings.CHAT_RAG),
+    settings.CHAT_RAG['EMBEDDER'],
+    top_k=settings.CHAT_RAG['TOP_K'],
+    workers=settings.CHAT_RAG['WORKERS'],
+) if settings.CHAT_RAG['ENABLED'] else None
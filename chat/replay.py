@@ -0,0 +1,182 @@
+# chat/replay.py
+import asyncio, dataclasses, json, random, time
+from unittest import mock
+import numpy as np
+from aiohttp import web
+from django.conf import settings
+from openai import AsyncOpenAI
+from backend.upstream import get_async_client
+from . import consumers
+from .context import context_builder
+from .ngram_index import ngram_text
+from .personas import registry
+
+
+class ReplayEnvironmentError(Exception):
+    pass
+
+
+# 오프라인 재생 벤치마크용 OpenAI 호환 가짜 서버 (POST /v1/chat/completions)
+# 마지막 사용자 메시지가 기준 질문이면 기준 답변을, 아니면 기본 답변을 지정한 지연으로 돌려준다.
+class FakeOpenAIServer:
+    def __init__(self, references, default_answer='그렇소.', first_token_ms=300, token_ms=20, jitter=0.1, chunk_chars=4):
+        self.references = {ngram_text(question): answer for question, answer in references}
+        self.default_answer = default_answer
+        self.first_token_ms = first_token_ms
+        self.token_ms = token_ms
+        self.jitter = jitter
+        self.chunk_chars = chunk_chars
+        self.requests = 0
+        self.prompt_chars = 0
+        self.runner = None
+        self.url = None
+
+    def _delay(self, milliseconds):
+        return milliseconds * random.uniform(1 - self.jitter, 1 + self.jitter) / 1000
+
+    def _answer(self, messages):
+        question = next((message['content'] for message in reversed(messages) if message['role'] == 'user'), '')
+        return self.references.get(ngram_text(question), self.default_answer)
+
+    async def completions(self, request):
+        body = await request.json()
+        messages = body.get('messages', [])
+        self.requests += 1
+        self.prompt_chars += sum(len(message.get('content') or '') for message in messages)
+
+        answer = self._answer(messages)
+        chunks = [answer[i:i + self.chunk_chars] for i in range(0, len(answer), self.chunk_chars)] or ['']
+        created = int(time.time())
+        model = body.get('model', 'replay')
+
+        await asyncio.sleep(self._delay(self.first_token_ms))
+        if not body.get('stream'):
+            await asyncio.sleep(self._delay(self.token_ms) * (len(chunks) - 1))
+            return web.json_response({
+                'id': 'chatcmpl-replay',
+                'object': 'chat.completion',
+                'created': created,
+                'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': answer}, 'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+            })
+
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        for index, chunk in enumerate(chunks):
+            if index:
+                await asyncio.sleep(self._delay(self.token_ms))
+            payload = {
+                'id': 'chatcmpl-replay',
+                'object': 'chat.completion.chunk',
+                'created': created,
+                'model': model,
+                'choices': [{'index': 0, 'delta': {'role': 'assistant', 'content': chunk}, 'finish_reason': None}],
+            }
+            await response.write(f'data: {json.dumps(payload, ensure_ascii=False)}\n\n'.encode('utf-8'))
+        await response.write(b'data: [DONE]\n\n')
+        await response.write_eof()
+        return response
+
+    async def start(self, host='127.0.0.1', port=0):
+        app = web.Application()
+        app.router.add_post('/v1/chat/completions', self.completions)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f'http://{host}:{port}/v1'
+        return self.url
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+
+# 페르소나 설정의 intents 파일(질문/기준 답변 JSONL) 경로, 없으면 None
+def persona_dataset(story_id):
+    with open(settings.CHAT_PERSONAS_FILE, encoding='utf-8') as f:
+        dataset = json.load(f).get(str(story_id), {}).get('intents')
+    return settings.BASE_DIR / dataset if dataset else None
+
+
+# 실제 파이프라인은 그대로 두고 모델 호출만 가짜 서버로 보낸다. (의도 분류기/캐시/RAG는 선택)
+async def install_fake_openai(url, intents=False, cache=False, rag=False):
+    consumers.client = AsyncOpenAI(api_key='replay', base_url=url, max_retries=0, http_client=get_async_client('openai'))
+    if not cache:
+        consumers.semantic_cache = None
+    elif consumers.semantic_cache is not None:
+        await asyncio.to_thread(consumers.semantic_cache.warm_up)
+    if not rag:
+        consumers.rag_store = None
+    await registry.refresh()
+    if not intents:
+        registry.personas = {story_id: dataclasses.replace(persona, intents=None) for story_id, persona in registry.personas.items()}
+
+
+# Redis 없이 재생하기 위한 프로세스 내부 대화 기록 저장소 (ChatHistoryStore와 같은 한도/순번/요약 규칙)
+class InMemoryHistoryStore:
+    sessions = {}
+
+    def __init__(self, key, redis=None, max_entries=6, max_bytes=16384, ttl=1800):
+        self.key = key
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.session = self.sessions.setdefault(key, {'items': [], 'summary': None, 'head': 0})
+
+    async def load(self):
+        return [message for message, _ in self.session['items']], self.session['summary'], self.session['head']
+
+    async def append(self, *messages):
+        items = self.session['items']
+        items.extend((message, len(json.dumps(message, ensure_ascii=False).encode('utf-8'))) for message in messages)
+        total = sum(size for _, size in items)
+        while items and (len(items) > self.max_entries or total > self.max_bytes):
+            total -= items.pop(0)[1]
+            self.session['head'] += 1
+        return total
+
+    async def fold(self, folded, summary, head):
+        if not folded:
+            return
+        items = self.session['items']
+        count = min(head + len(folded) - self.session['head'], len(items))
+        if count > 0:
+            del items[:count]
+            self.session['head'] += count
+        self.session['summary'] = summary
+
+    async def clear(self):
+        self.session.update(items=[], summary=None, head=0)
+
+    async def release(self, delete=False):
+        if delete:
+            await self.clear()
+
+
+# CI처럼 네트워크가 없는 환경에서 대화 기록, single-flight, 페르소나 버전 확인이 Redis를 찾지 않도록 프로세스 내부 상태만 사용
+def use_local_state():
+    consumers.ChatHistoryStore = InMemoryHistoryStore
+    consumers.singleflight = None
+    registry.load()
+    registry.check_interval = float('inf')
+
+
+# tiktoken 인코딩 파일을 내려받지 않고 로컬 캐시(TIKTOKEN_CACHE_DIR, 기본값은 임시 디렉터리의 data-gym-cache)에서만 로드
+def load_cached_encoding(counter=context_builder.counter):
+    def download(blobpath):
+        raise ReplayEnvironmentError(
+            f'tiktoken 인코딩 {counter.encoding_name}이 로컬 캐시에 없습니다: {blobpath} '
+            '(네트워크가 되는 환경에서 한 번 로드하거나 TIKTOKEN_CACHE_DIR에 미리 넣어 두세요.)'
+        )
+    with mock.patch('tiktoken.load.read_file', download):
+        counter.encoding
+
+
+# 초 단위 측정값을 ms 단위 p50/p95/p99로 요약
+def percentiles(values):
+    if not values:
+        return {'p50': None, 'p95': None, 'p99': None}
+    values = np.asarray(values, dtype=np.float64) * 1000
+    return {name: round(float(np.percentile(values, q)), 1) for name, q in (('p50', 50), ('p95', 95), ('p99', 99))}
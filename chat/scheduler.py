@@ -0,0 +1,162 @@
+# chat/scheduler.py
+import asyncio, logging, random, time
+import openai
+from django.conf import settings
+from .metrics import UPSTREAM_QUEUE_DEPTH, UPSTREAM_REJECTED, UPSTREAM_RETRIES, UPSTREAM_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class SchedulerBusy(Exception):
+    pass
+
+
+# 분당 허용량을 초 단위로 채워 넣는 토큰 버킷
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount):
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+
+def retry_after_seconds(error):
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except ValueError:
+        return None
+    return None
+
+
+# 연결 오류(타임아웃 포함), 429, 5xx는 일시적인 오류로 보고 재시도 (SDK 자체 재시도는 끄고 여기서만 재시도)
+RETRYABLE_ERRORS = (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)
+
+
+# OpenAI 호출 앞단의 프로세스 단위 스케줄러
+# 동시 호출 수 제한, RPM/TPM 토큰 버킷, 대기열 길이 제한, 일시적 오류 재시도를 담당한다.
+class UpstreamScheduler:
+    def __init__(self, max_concurrency, requests_per_minute, tokens_per_minute, max_queue, max_wait, max_retries, retry_jitter,
+                 retry_base_delay=0.5, retry_max_delay=8):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.rate_lock = asyncio.Lock()
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.retry_jitter = retry_jitter
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.max_concurrency = max_concurrency
+        self.inflight = 0
+
+    async def _admit(self, estimated_tokens):
+        await self.semaphore.acquire()
+        try:
+            # 속도 제한은 도착 순서대로 적용
+            async with self.rate_lock:
+                while True:
+                    delay = max(self.request_bucket.wait_time(1), self.token_bucket.wait_time(estimated_tokens))
+                    if delay <= 0:
+                        break
+                    await asyncio.sleep(delay)
+                self.request_bucket.take(1)
+                self.token_bucket.take(estimated_tokens)
+        except BaseException:
+            self.semaphore.release()
+            raise
+
+    # 헤지 요청용: 기다리지 않고 바로 동시 호출 자리와 RPM/TPM 한도가 있을 때만 차감하고 반납 함수를 반환, 없으면 None
+    async def reserve(self, estimated_tokens):
+        if self.semaphore.locked() or self.rate_lock.locked():
+            return None
+        if self.request_bucket.wait_time(1) > 0 or self.token_bucket.wait_time(estimated_tokens) > 0:
+            return None
+        # 잠겨 있지 않으면 acquire는 양보 없이 바로 끝나므로 위의 확인과 차감 사이에 다른 요청이 끼어들지 않는다.
+        await self.semaphore.acquire()
+        self.request_bucket.take(1)
+        self.token_bucket.take(estimated_tokens)
+        return self.semaphore.release
+
+    async def run(self, fn, estimated_tokens):
+        # 동시 호출 한도를 넘는 요청만 대기열로 본다.
+        if self.inflight - self.max_concurrency >= self.max_queue:
+            UPSTREAM_REJECTED.inc()
+            raise SchedulerBusy('upstream queue is full')
+        self.inflight += 1
+        UPSTREAM_QUEUE_DEPTH.set(max(0, self.inflight - self.max_concurrency))
+        try:
+            return await self._run(fn, estimated_tokens)
+        finally:
+            self.inflight -= 1
+            UPSTREAM_QUEUE_DEPTH.set(max(0, self.inflight - self.max_concurrency))
+
+    async def _run(self, fn, estimated_tokens):
+        started_at = time.monotonic()
+        try:
+            await asyncio.wait_for(self._admit(estimated_tokens), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            UPSTREAM_REJECTED.inc()
+            raise SchedulerBusy('timed out waiting for an upstream slot')
+        UPSTREAM_WAIT_SECONDS.observe(time.monotonic() - started_at)
+
+        try:
+            return await self._call_with_retry(fn)
+        finally:
+            self.semaphore.release()
+
+    # Retry-After가 있으면 그 시간만큼, 없으면 상한이 있는 지수 백오프(full jitter)만큼 기다린 뒤 재시도
+    def retry_delay(self, error, attempt):
+        delay = retry_after_seconds(error)
+        if delay is not None:
+            return min(delay, self.retry_max_delay) + random.uniform(0, self.retry_jitter)
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+
+    async def _call_with_retry(self, fn):
+        attempt = 0
+        while True:
+            try:
+                return await fn()
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.retry_delay(e, attempt)
+                attempt += 1
+                UPSTREAM_RETRIES.inc()
+                logger.warning(f'Upstream call failed ({type(e).__name__}), retrying after {delay:.2f}s (attempt {attempt}/{self.max_retries})')
+                await asyncio.sleep(delay)
+
+
+scheduler = UpstreamScheduler(
+    max_concurrency=settings.CHAT_UPSTREAM_SCHEDULER['MAX_CONCURRENCY'],
+    requests_per_minute=settings.CHAT_UPSTREAM_SCHEDULER['REQUESTS_PER_MINUTE'],
+    tokens_per_minute=settings.CHAT_UPSTREAM_SCHEDULER['TOKENS_PER_MINUTE'],
+    max_queue=settings.CHAT_UPSTREAM_SCHEDULER['MAX_QUEUE'],
+    max_wait=settings.CHAT_UPSTREAM_SCHEDULER['MAX_WAIT'],
+    max_retries=settings.CHAT_UPSTREAM_SCHEDULER['MAX_RETRIES'],
+    retry_jitter=settings.CHAT_UPSTREAM_SCHEDULER['RETRY_JITTER'],
+    retry_base_delay=settings.CHAT_UPSTREAM_SCHEDULER['RETRY_BASE_DELAY'],
+    retry_max_delay=settings.CHAT_UPSTREAM_SCHEDULER['RETRY_MAX_DELAY'],
+)
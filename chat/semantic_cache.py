@@ -0,0 +1,129 @@
+# chat/semantic_cache.py
+import asyncio, logging, threading, time
+from collections import OrderedDict
+import faiss
+import numpy as np
+from django.conf import settings
+from .embeddings import build_embedder, normalize_text
+from .metrics import SEMANTIC_CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# 위인 하나에 대한 의미 기반 응답 캐시 (FAISS 내적 검색 + LRU/TTL 만료)
+class PersonaSemanticCache:
+    def __init__(self, dim, max_entries, ttl):
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        self.entries = OrderedDict()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.next_id = 0
+
+    def _remove(self, entry_ids):
+        for entry_id in entry_ids:
+            self.entries.pop(entry_id, None)
+        self.index.remove_ids(np.array(entry_ids, dtype=np.int64))
+
+    def search(self, vector, threshold):
+        if not self.entries:
+            return None
+
+        scores, ids = self.index.search(vector.reshape(1, -1), 1)
+        entry_id, score = int(ids[0][0]), float(scores[0][0])
+        if entry_id < 0 or score < threshold:
+            return None
+
+        answer, stored_at = self.entries[entry_id]
+        if time.monotonic() - stored_at > self.ttl:
+            self._remove([entry_id])
+            return None
+
+        self.entries.move_to_end(entry_id)
+        return answer
+
+    def add(self, vector, answer):
+        now = time.monotonic()
+        expired = [entry_id for entry_id, (_, stored_at) in self.entries.items() if now - stored_at > self.ttl]
+        # 만료된 항목을 제외하고도 가득 차 있으면 가장 오래 사용되지 않은 항목부터 제거
+        overflow = len(self.entries) - len(expired) - self.max_entries + 1
+        if overflow > 0:
+            skip = set(expired)
+            expired += [entry_id for entry_id in self.entries if entry_id not in skip][:overflow]
+        if expired:
+            self._remove(expired)
+
+        entry_id = self.next_id
+        self.next_id += 1
+        self.index.add_with_ids(vector.reshape(1, -1), np.array([entry_id], dtype=np.int64))
+        self.entries[entry_id] = (answer, now)
+
+
+# 위인별 캐시를 관리하고, 임베딩과 검색은 워커 스레드에서 처리한다.
+# 캐시는 최적화일 뿐이므로 임베더가 아직 로드되지 않았거나 오류가 나면 캐시 미스로 보고 대화는 계속한다.
+class SemanticCache:
+    def __init__(self, embedder, threshold, max_entries, ttl, min_chars=0):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.min_chars = min_chars
+        self.caches = {}
+        self.lock = threading.Lock()
+
+    def _persona_cache(self, story_id):
+        if story_id not in self.caches:
+            self.caches[story_id] = PersonaSemanticCache(self.embedder.dim, self.max_entries, self.ttl)
+        return self.caches[story_id]
+
+    def _lookup(self, story_id, text):
+        vector = self.embedder.embed([text])[0]
+        with self.lock:
+            return self._persona_cache(story_id).search(vector, self.threshold), vector
+
+    def _store(self, story_id, vector, answer):
+        with self.lock:
+            self._persona_cache(story_id).add(vector, answer)
+
+    # 서버 시작 시 백그라운드 스레드에서 임베딩 모델을 로드, 실패하면 이 프로세스는 캐시 없이 동작
+    def warm_up(self):
+        try:
+            self.embedder.load()
+            logger.info(f'Semantic cache embedder loaded: {type(self.embedder).__name__}')
+        except Exception as e:
+            logger.error(f'Failed to load semantic cache embedder, continuing without cache: {str(e)}')
+
+    def cacheable(self, text):
+        return self.embedder.loaded and len(normalize_text(text)) >= self.min_chars
+
+    # (캐시된 응답 또는 None, 저장 시 재사용할 임베딩) 반환
+    async def lookup(self, story_id, text):
+        try:
+            answer, vector = await asyncio.to_thread(self._lookup, story_id, text)
+        except Exception as e:
+            SEMANTIC_CACHE_REQUESTS.labels(story_id, 'error').inc()
+            logger.error(f'Semantic cache lookup failed (Story ID {story_id}): {str(e)}')
+            return None, None
+        SEMANTIC_CACHE_REQUESTS.labels(story_id, 'hit' if answer is not None else 'miss').inc()
+        return answer, vector
+
+    async def store(self, story_id, vector, answer):
+        try:
+            await asyncio.to_thread(self._store, story_id, vector, answer)
+        except Exception as e:
+            logger.error(f'Semantic cache store failed (Story ID {story_id}): {str(e)}')
+
+    def clear(self):
+        with self.lock:
+            self.caches.clear()
+
+
+def build_semantic_cache(config):
+    return SemanticCache(
+        build_embedder(config),
+        threshold=config['THRESHOLD'],
+        max_entries=config['MAX_ENTRIES'],
+        ttl=config['TTL'],
+        min_chars=config.get('MIN_CHARS', 0),
+    )
+
+
+semantic_cache = build_semantic_cache(settings.CHAT_SEMANTIC_CACHE) if settings.CHAT_SEMANTIC_CACHE['ENABLED'] else None
@@ -0,0 +1,120 @@
+# chat/singleflight.py
+import asyncio, hashlib, json, logging, time, uuid
+from django.conf import settings
+from .embeddings import normalize_text
+from .history import get_redis
+from .metrics import SINGLEFLIGHT_COALESCING_RATIO, SINGLEFLIGHT_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# 잠금을 가진 요청만 잠금을 해제하도록 토큰을 비교한 뒤 삭제
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+# (모델, 정규화된 요청 메시지)가 같은 요청은 같은 키를 갖는다.
+def request_key(model, messages):
+    digest = hashlib.sha256()
+    digest.update(model.encode('utf-8'))
+    digest.update(json.dumps(messages[:-1], ensure_ascii=False, sort_keys=True).encode('utf-8'))
+    digest.update(normalize_text(messages[-1]['content']).encode('utf-8'))
+    return digest.hexdigest()
+
+
+# 동일한 요청이 동시에 들어오면 업스트림 호출을 한 번만 하고 결과를 공유한다.
+# 프로세스 안에서는 Future로, 프로세스 간에는 Redis 잠금과 짧게 저장된 결과로 합친다.
+class SingleFlight:
+    def __init__(self, lock_ttl, result_ttl, poll_interval):
+        self.lock_ttl = lock_ttl
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self.inflight = {}
+        self.counts = {'leader': 0, 'follower': 0}
+
+    def _record(self, role):
+        SINGLEFLIGHT_REQUESTS.labels(role).inc()
+        self.counts['follower' if role != 'leader' else 'leader'] += 1
+        total = self.counts['leader'] + self.counts['follower']
+        SINGLEFLIGHT_COALESCING_RATIO.set(self.counts['follower'] / total)
+
+    # fn은 인자 없는 코루틴 함수, 이 호출이 업스트림을 직접 호출했는지 여부를 함께 반환
+    async def do(self, key, fn):
+        future = self.inflight.get(key)
+        if future is not None:
+            self._record('local_follower')
+            try:
+                return await asyncio.shield(future), False
+            except asyncio.CancelledError:
+                # 앞선 요청의 연결이 끊겨 취소된 경우에는 직접 호출
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+            return await self.do(key, fn)
+
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        try:
+            result, leader = await self._do_shared(key, fn)
+            future.set_result(result)
+            return result, leader
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 기다리는 요청이 없어도 경고가 남지 않도록 예외를 회수해둔다.
+            future.exception()
+            raise
+        finally:
+            del self.inflight[key]
+
+    async def _do_shared(self, key, fn):
+        redis = get_redis()
+        lock_key = f'singleflight:lock:{key}'
+        result_key = f'singleflight:result:{key}'
+        token = uuid.uuid4().hex
+
+        try:
+            acquired = await redis.set(lock_key, token, nx=True, ex=self.lock_ttl)
+        except Exception as e:
+            logger.error(f'Single-flight lock unavailable, calling upstream directly: {str(e)}')
+            self._record('leader')
+            return await fn(), True
+
+        if acquired:
+            self._record('leader')
+            try:
+                result = await fn()
+                if result:
+                    await redis.set(result_key, json.dumps(result, ensure_ascii=False), ex=self.result_ttl)
+                return result, True
+            finally:
+                await redis.eval(RELEASE_SCRIPT, 1, lock_key, token)
+
+        # 다른 프로세스가 같은 요청을 처리 중이면 결과가 저장될 때까지 대기
+        deadline = time.monotonic() + self.lock_ttl
+        while time.monotonic() < deadline:
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.get(result_key)
+                pipe.exists(lock_key)
+                cached, locked = await pipe.execute()
+            if cached is not None:
+                self._record('remote_follower')
+                return json.loads(cached), False
+            if not locked:
+                break
+            await asyncio.sleep(self.poll_interval)
+
+        # 앞선 요청이 실패했거나 너무 오래 걸리면 직접 호출
+        self._record('leader')
+        return await fn(), True
+
+
+singleflight = SingleFlight(
+    lock_ttl=settings.CHAT_SINGLEFLIGHT['LOCK_TTL'],
+    result_ttl=settings.CHAT_SINGLEFLIGHT['RESULT_TTL'],
+    poll_interval=settings.CHAT_SINGLEFLIGHT['POLL_INTERVAL'],
+) if settings.CHAT_SINGLEFLIGHT['ENABLED'] else None
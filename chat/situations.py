@@ -0,0 +1,42 @@
+# chat/situations.py
+import re
+import numpy as np
+from .ngram_index import CharNgramIndex
+
+# "'상황': '<라벨>': '<예시 답변>'" 형식에서 라벨 추출
+SITUATION_LABEL_PATTERN = re.compile(r"'상황':\s*'([^']*)'")
+
+
+# 페르소나 프롬프트의 상황별 예시를 색인해두고 현재 메시지와 관련된 상위 k개만 고른다.
+# 짧은 질문이 긴 예시 답변에 묻히지 않도록 라벨과 전체 문장 중 더 높은 유사도를 사용한다.
+class SituationIndex:
+    def __init__(self, situations, top_k=2, min_score=0.08, ngram_range=(1, 3)):
+        self.situations = list(situations)
+        self.top_k = top_k
+        self.min_score = min_score
+        labels = []
+        for situation in self.situations:
+            match = SITUATION_LABEL_PATTERN.match(situation)
+            labels.append(match.group(1) if match else situation)
+        self.text_index = CharNgramIndex(self.situations, ngram_range)
+        self.label_index = CharNgramIndex(labels, ngram_range)
+
+    def __len__(self):
+        return len(self.situations)
+
+    def scores(self, text):
+        scores = np.zeros(len(self.situations), dtype=np.float32)
+        for index in (self.text_index, self.label_index):
+            found = index.scores(text)
+            if found is not None:
+                np.maximum(scores, found, out=scores)
+        return scores
+
+    # 관련 상황 예시의 위치를 원래 프롬프트 순서대로 반환 (조합별 프롬프트 캐시의 키로 사용)
+    def select_indexes(self, text):
+        scores = self.scores(text)
+        top = np.argsort(-scores)[:self.top_k]
+        return tuple(int(index) for index in sorted(top) if scores[index] >= self.min_score)
+
+    def select(self, text):
+        return [self.situations[index] for index in self.select_indexes(text)]
@@ -0,0 +1,56 @@
+# chat/streaming.py
+import re
+
+
+# 치환 규칙을 한 번만 컴파일해두고 여러 응답에서 공유한다.
+class ReplacementRules:
+    def __init__(self, replacements):
+        self.replacements = dict(replacements or {})
+
+        if self.replacements:
+            keys = sorted(self.replacements, key=len, reverse=True)
+            self.pattern = re.compile('|'.join(re.escape(key) for key in keys))
+            self.prefixes = frozenset(key[:i] for key in keys for i in range(1, len(key)))
+            self.max_hold = max(len(key) for key in keys) - 1
+        else:
+            self.pattern = None
+            self.prefixes = frozenset()
+            self.max_hold = 0
+
+    def apply(self, text):
+        if self.pattern is None:
+            return text
+        return self.pattern.sub(lambda match: self.replacements[match.group(0)], text)
+
+
+# 스트리밍 응답에 후처리(이름 치환)를 적용하는 버퍼
+# 청크 경계에서 이름이 잘려 들어와도 치환될 수 있도록, 아직 완성되지 않았을 수 있는 꼬리 부분은 보류해둔다.
+class StreamingReplacer:
+    def __init__(self, rules=None):
+        self.rules = rules or ReplacementRules(None)
+        self.buffer = ''
+
+    def _hold_length(self):
+        # 버퍼 끝에서 치환 대상의 앞부분과 일치하는 가장 긴 접미사 길이
+        for length in range(min(self.rules.max_hold, len(self.buffer)), 0, -1):
+            if self.buffer[-length:] in self.rules.prefixes:
+                return length
+        return 0
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        cut = len(self.buffer) - self._hold_length()
+
+        # 보류 지점에 걸쳐 있는 완성된 치환 대상은 끝까지 내보낸다.
+        if self.rules.pattern is not None:
+            for match in self.rules.pattern.finditer(self.buffer):
+                if match.start() >= cut:
+                    break
+                cut = max(cut, match.end())
+
+        ready, self.buffer = self.buffer[:cut], self.buffer[cut:]
+        return self.rules.apply(ready)
+
+    def flush(self):
+        ready, self.buffer = self.buffer, ''
+        return self.rules.apply(ready)
@@ -0,0 +1,46 @@
+# chat/stt.py
+import logging
+import httpx
+from django.conf import settings
+from backend.upstream import CircuitOpen, get_async_client, get_breaker, is_retryable_status
+
+logger = logging.getLogger(__name__)
+
+NAVER_STT_URL = 'https://naveropenapi.apigw.ntruss.com/recog/v1/stt'
+
+
+def stt_headers():
+    return {
+        'Content-Type': 'application/octet-stream',
+        'X-NCP-APIGW-API-KEY-ID': settings.NAVER_CLIENT_ID,
+        'X-NCP-APIGW-API-KEY': settings.NAVER_CLIENT_SECRET,
+    }
+
+
+async def request_stt(audio_data, lang):
+    response = await get_async_client('naver_stt').post(
+        NAVER_STT_URL, params={'lang': lang}, content=audio_data, headers=stt_headers()
+    )
+    # 서버 오류와 요청 한도 초과(429) 등 재시도 가능한 4xx는 예외로 올려 서킷 브레이커에 실패로 기록
+    if is_retryable_status(response.status_code):
+        response.raise_for_status()
+    return response
+
+
+# 네이버 STT API로 음성을 텍스트로 변환, 실패하면 None 반환 (공용 keep-alive 커넥션 풀 사용)
+# 같은 음성을 다시 보내도 결과가 같으므로 지연될 때는 헤지 요청을 허용한다.
+async def transcribe(audio_data, lang='Kor'):
+    try:
+        response = await get_breaker('naver_stt').call_async(lambda: request_stt(audio_data, lang), hedge=True)
+    except CircuitOpen:
+        logger.warning("STT circuit is open, skipping request")
+        return None
+    except httpx.HTTPError as e:
+        logger.error(f"STT API request failed: {str(e)}")
+        return None
+
+    if response.status_code == 200:
+        return response.json().get('text')
+
+    logger.error(f"STT API request failed with status code: {response.status_code}")
+    return None
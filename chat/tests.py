@@ -0,0 +1,420 @@
+import asyncio, json, tempfile
+from pathlib import Path
+from unittest import mock
+import httpx, openai
+from django.test import SimpleTestCase
+from .context import MESSAGE_OVERHEAD_TOKENS, ContextBuilder, TokenCounter, summary_request
+from .embeddings import HashingEmbedder
+from .intents import IntentMatcher, load_intent_pairs
+from .keyword_router import KeywordRouter
+from .ngram_index import CharNgramIndex
+from .scheduler import SchedulerBusy, TokenBucket, UpstreamScheduler
+from .semantic_cache import SemanticCache
+from .streaming import ReplacementRules, StreamingReplacer
+
+
+class StreamingReplacerTests(SimpleTestCase):
+    def setUp(self):
+        self.rules = ReplacementRules({'이순신': '나', '이순신 장군': '나', '장군님': '그대'})
+
+    def stream(self, chunks):
+        replacer = StreamingReplacer(self.rules)
+        parts = [replacer.feed(chunk) for chunk in chunks]
+        parts.append(replacer.flush())
+        return parts
+
+    def test_replaces_name_split_across_chunks(self):
+        parts = self.stream(['저는 이', '순', '신입니다.'])
+        self.assertEqual(''.join(parts), '저는 나입니다.')
+        # 완성되지 않은 이름의 앞부분은 다음 청크까지 보류
+        self.assertEqual(parts[0], '저는 ')
+
+    def test_prefers_longest_replacement(self):
+        self.assertEqual(''.join(self.stream(['이순신 장', '군이오.'])), '나이오.')
+
+    def test_releases_text_that_cannot_start_a_name(self):
+        replacer = StreamingReplacer(self.rules)
+        self.assertEqual(replacer.feed('안녕하시오'), '안녕하시오')
+        self.assertEqual(replacer.flush(), '')
+
+    def test_flush_releases_held_prefix_unchanged(self):
+        self.assertEqual(''.join(self.stream(['그는 이순'])), '그는 이순')
+
+    def test_matches_non_streaming_result_for_every_split(self):
+        text = '장군님, 이순신 장군은 이순신이라 불리오.'
+        expected = self.rules.apply(text)
+        for cut in range(len(text) + 1):
+            for second in range(cut, len(text) + 1):
+                chunks = [text[:cut], text[cut:second], text[second:]]
+                self.assertEqual(''.join(self.stream(chunks)), expected, chunks)
+
+    def test_without_rules_passes_text_through(self):
+        replacer = StreamingReplacer()
+        self.assertEqual(replacer.feed('이순'), '이순')
+        self.assertEqual(replacer.flush(), '')
+
+
+class KeywordRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = KeywordRouter([
+            ('battles', ['한산도 대첩', '명량', '노량']),
+            ('ships', ['거북선', '판옥선']),
+            ('family', ['어머니']),
+        ])
+
+    def test_returns_topics_in_order_of_first_appearance(self):
+        self.assertEqual(self.router.match('거북선으로 명량에서 싸웠소? 판옥선도?'), ['ships', 'battles'])
+
+    def test_ignores_whitespace_in_keywords_and_message(self):
+        self.assertEqual(self.router.match('한산도대첩 이야기'), ['battles'])
+        self.assertEqual(self.router.match('한산 도 대 첩'), ['battles'])
+
+    def test_finds_keywords_overlapping_a_failed_prefix(self):
+        # '노' 다음 '노량'처럼 실패 링크로 돌아가야 찾을 수 있는 경우
+        self.assertEqual(self.router.match('노노량'), ['battles'])
+
+    def test_shared_keyword_maps_to_every_topic(self):
+        router = KeywordRouter([('a', ['이순신']), ('b', ['순신'])])
+        self.assertEqual(router.match('이순신'), ['a', 'b'])
+
+    def test_no_match_and_empty_router(self):
+        self.assertEqual(self.router.match('오늘 날씨는 어떻소'), [])
+        self.assertTrue(self.router)
+        self.assertFalse(KeywordRouter([]))
+        self.assertEqual(KeywordRouter([('empty', ['', '  '])]).match('아무 말'), [])
+
+
+class CharNgramIndexTests(SimpleTestCase):
+    def test_scores_are_cosine_similarities(self):
+        index = CharNgramIndex(['이름이 무엇이오', '어디서 태어났소'])
+        scores = index.scores('이름이 무엇이오?')
+        self.assertAlmostEqual(float(scores[0]), 1.0, places=5)
+        self.assertLess(float(scores[1]), 0.2)
+
+    def test_unseen_ngrams_lower_the_score(self):
+        index = CharNgramIndex(['이름이 무엇이오'])
+        self.assertLess(float(index.scores('이름이 무엇이오 그리고 고향은 어디요')[0]), 0.8)
+
+    def test_no_overlap_returns_none(self):
+        index = CharNgramIndex(['이름이 무엇이오'])
+        self.assertIsNone(index.scores('xyz'))
+        self.assertEqual(index.search('xyz'), [])
+
+    def test_search_orders_by_score_and_applies_min_score(self):
+        index = CharNgramIndex(['거북선', '거북선은 언제 만들었소', '판옥선'])
+        found = index.search('거북선은 언제', k=3)
+        self.assertEqual(found[0][0], 1)
+        self.assertEqual([score for _, score in found], sorted((score for _, score in found), reverse=True))
+        self.assertTrue(all(score >= 0.5 for _, score in index.search('거북선은 언제', k=3, min_score=0.5)))
+
+
+class IntentMatcherTests(SimpleTestCase):
+    def setUp(self):
+        self.matcher = IntentMatcher([
+            ('이름이 무엇이오?', '나는 이순신이오.'),
+            ('어디서 태어났소?', '한성 건천동에서 태어났소.'),
+        ], threshold=0.8)
+
+    def test_answers_same_question_regardless_of_spacing_and_punctuation(self):
+        self.assertEqual(self.matcher.answer('이름이   무엇이오?!'), '나는 이순신이오.')
+
+    def test_below_threshold_returns_none(self):
+        index, score = self.matcher.match('이름이 뭐요?')
+        self.assertEqual(index, 0)
+        self.assertLess(score, 0.8)
+        self.assertIsNone(self.matcher.answer('이름이 뭐요?'))
+        self.assertEqual(self.matcher.answer('이름이 뭐요?', threshold=score), '나는 이순신이오.')
+
+    def test_unrelated_question_returns_none(self):
+        self.assertEqual(self.matcher.match('xyz'), (None, 0.0))
+        self.assertIsNone(self.matcher.answer('xyz'))
+
+    def test_load_intent_pairs_reads_user_assistant_turns(self):
+        lines = [
+            {'messages': [
+                {'role': 'system', 'content': '너는 이순신이다.'},
+                {'role': 'user', 'content': 'q1'}, {'role': 'assistant', 'content': 'a1'},
+                {'role': 'user', 'content': 'q2'}, {'role': 'assistant', 'content': 'a2'},
+            ]},
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'intents.jsonl'
+            path.write_text('\n'.join(json.dumps(line, ensure_ascii=False) for line in lines) + '\n\n', encoding='utf-8')
+            self.assertEqual(load_intent_pairs(path), [('q1', 'a1'), ('q2', 'a2')])
+
+
+# 인코딩 파일 없이 글자 수를 토큰 수로 세는 카운터
+class CharTokenCounter(TokenCounter):
+    def __init__(self):
+        super().__init__('test')
+
+    def count_text(self, text):
+        return len(text or '')
+
+
+def turn(index, length=10):
+    return [
+        {"role": "user", "content": f"q{index}".ljust(length, '.')},
+        {"role": "assistant", "content": f"a{index}".ljust(length, '.')},
+    ]
+
+
+class ContextBuilderTests(SimpleTestCase):
+    prefix = ({"role": "system", "content": "persona"},)
+    user_message = {"role": "user", "content": "now"}
+    # 한 턴(메시지 2개)의 토큰 수
+    turn_cost = 2 * (MESSAGE_OVERHEAD_TOKENS + 10)
+
+    def build(self, history, history_tokens, summary=None, context=()):
+        builder = ContextBuilder(CharTokenCounter(), history_tokens=history_tokens, summary_max_tokens=100)
+        return builder.build(self.prefix, summary, history, list(context), self.user_message)
+
+    def test_keeps_recent_turns_within_budget_and_folds_the_rest(self):
+        history = turn(1) + turn(2) + turn(3)
+        messages, folded = self.build(history, history_tokens=2 * self.turn_cost)
+        self.assertEqual(folded, turn(1))
+        self.assertEqual(messages, [*self.prefix, *turn(2), *turn(3), self.user_message])
+
+    def test_budget_boundary_is_inclusive(self):
+        history = turn(1) + turn(2)
+        self.assertEqual(self.build(history, history_tokens=2 * self.turn_cost)[1], [])
+        self.assertEqual(self.build(history, history_tokens=2 * self.turn_cost - 1)[1], turn(1))
+
+    def test_turn_larger_than_budget_stops_at_newest(self):
+        history = turn(1) + turn(2, length=100)
+        messages, folded = self.build(history, history_tokens=self.turn_cost)
+        # 최신 턴이 예산보다 크면 그보다 오래된 턴도 건너뛰지 않고 모두 접는다.
+        self.assertEqual(folded, history)
+        self.assertEqual(messages, [*self.prefix, self.user_message])
+
+    def test_unpaired_leading_entry_is_folded(self):
+        orphan = [{"role": "assistant", "content": "orphan"}]
+        messages, folded = self.build(orphan + turn(1), history_tokens=10 * self.turn_cost)
+        self.assertEqual(folded, orphan)
+        self.assertEqual(messages[1:3], turn(1))
+
+    def test_summary_and_context_order(self):
+        context = [{"role": "system", "content": "rag"}]
+        messages, _ = self.build(turn(1), history_tokens=self.turn_cost, summary='요약', context=context)
+        self.assertEqual(messages[1], {"role": "system", "content": "지금까지의 대화 요약: 요약"})
+        self.assertEqual(messages[2:], [*turn(1), *context, self.user_message])
+
+    def test_summary_request_includes_previous_summary_and_speakers(self):
+        request = summary_request('이전', turn(1))
+        self.assertEqual(request[0]['role'], 'system')
+        self.assertEqual(request[1]['content'].splitlines(), ['[기존 요약]', '이전', '[이어지는 대화]', '사용자: q1........', '인물: a1........'])
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_wait_time_refills_per_second(self):
+        with mock.patch('chat.scheduler.time.monotonic', return_value=100.0) as monotonic:
+            bucket = TokenBucket(60)
+            self.assertEqual(bucket.wait_time(60), 0.0)
+            bucket.take(60)
+            self.assertAlmostEqual(bucket.wait_time(30), 30.0)
+            monotonic.return_value = 110.0
+            self.assertAlmostEqual(bucket.wait_time(30), 20.0)
+            monotonic.return_value = 1000.0
+            # 용량 이상은 채우지 않는다.
+            self.assertEqual(bucket.tokens, 10.0)
+            self.assertEqual(bucket.wait_time(60), 0.0)
+            self.assertEqual(bucket.tokens, 60.0)
+
+    def test_request_larger_than_capacity_is_clamped(self):
+        bucket = TokenBucket(10)
+        self.assertEqual(bucket.wait_time(1000), 0.0)
+        bucket.take(1000)
+        self.assertAlmostEqual(bucket.tokens, 0.0, places=3)
+
+
+def make_scheduler(**overrides):
+    options = dict(
+        max_concurrency=1, requests_per_minute=6000, tokens_per_minute=600000, max_queue=10, max_wait=1,
+        max_retries=2, retry_jitter=0, retry_base_delay=0.001, retry_max_delay=0.01,
+    )
+    options.update(overrides)
+    return UpstreamScheduler(**options)
+
+
+def connection_error():
+    return openai.APIConnectionError(request=httpx.Request('POST', 'https://api.openai.com/v1/chat/completions'))
+
+
+class UpstreamSchedulerTests(SimpleTestCase):
+    async def test_limits_concurrency(self):
+        scheduler = make_scheduler(max_concurrency=2)
+        running, peak = 0, 0
+
+        async def call():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return 'ok'
+
+        results = await asyncio.gather(*(scheduler.run(call, 10) for _ in range(5)))
+        self.assertEqual(results, ['ok'] * 5)
+        self.assertEqual(peak, 2)
+        self.assertEqual(scheduler.inflight, 0)
+
+    async def test_rejects_when_queue_is_full(self):
+        scheduler = make_scheduler(max_queue=0)
+        release = asyncio.Event()
+        first = asyncio.create_task(scheduler.run(release.wait, 10))
+        await asyncio.sleep(0)
+        with self.assertRaises(SchedulerBusy):
+            await scheduler.run(release.wait, 10)
+        release.set()
+        await first
+        self.assertEqual(scheduler.inflight, 0)
+
+    async def test_rejects_after_max_wait(self):
+        scheduler = make_scheduler(max_wait=0.02)
+        release = asyncio.Event()
+        first = asyncio.create_task(scheduler.run(release.wait, 10))
+        await asyncio.sleep(0)
+        with self.assertRaises(SchedulerBusy):
+            await scheduler.run(release.wait, 10)
+        release.set()
+        await first
+        # 기다리다 포기한 요청은 자리를 차지하지 않는다.
+        self.assertFalse(scheduler.semaphore.locked())
+
+    async def test_waits_for_token_budget(self):
+        scheduler = make_scheduler(max_concurrency=5, tokens_per_minute=60, max_wait=0.05)
+
+        async def call():
+            return 'ok'
+
+        self.assertEqual(await scheduler.run(call, 60), 'ok')
+        with self.assertRaises(SchedulerBusy):
+            await scheduler.run(call, 30)
+
+    async def test_retries_transient_errors(self):
+        scheduler = make_scheduler()
+        attempts = 0
+
+        async def call():
+            nonlocal attempts
+            attempts += 1
+            if attempts < 3:
+                raise connection_error()
+            return 'ok'
+
+        with self.assertLogs('chat.scheduler', 'WARNING') as logs:
+            self.assertEqual(await scheduler.run(call, 10), 'ok')
+        self.assertEqual(attempts, 3)
+        self.assertEqual(len(logs.records), 2)
+
+    async def test_gives_up_after_max_retries_and_skips_other_errors(self):
+        scheduler = make_scheduler(max_retries=1)
+        attempts = 0
+
+        async def failing():
+            nonlocal attempts
+            attempts += 1
+            raise connection_error()
+
+        with self.assertRaises(openai.APIConnectionError), self.assertLogs('chat.scheduler', 'WARNING'):
+            await scheduler.run(failing, 10)
+        self.assertEqual(attempts, 2)
+
+        async def bad_request():
+            nonlocal attempts
+            attempts += 1
+            raise ValueError('bad request')
+
+        attempts = 0
+        with self.assertRaises(ValueError):
+            await scheduler.run(bad_request, 10)
+        self.assertEqual(attempts, 1)
+        self.assertFalse(scheduler.semaphore.locked())
+
+    def test_retry_delay_uses_retry_after_capped(self):
+        scheduler = make_scheduler(retry_max_delay=5)
+        request = httpx.Request('POST', 'https://api.openai.com/v1/chat/completions')
+        error = openai.RateLimitError('rate limited', response=httpx.Response(429, headers={'retry-after': '2'}, request=request), body=None)
+        self.assertEqual(scheduler.retry_delay(error, 0), 2.0)
+        error = openai.RateLimitError('rate limited', response=httpx.Response(429, headers={'retry-after': '60'}, request=request), body=None)
+        self.assertEqual(scheduler.retry_delay(error, 0), 5.0)
+
+    def test_retry_delay_backoff_is_capped(self):
+        scheduler = make_scheduler(retry_base_delay=0.5, retry_max_delay=8)
+        for attempt in range(10):
+            self.assertLessEqual(scheduler.retry_delay(connection_error(), attempt), min(8, 0.5 * 2 ** attempt))
+
+    async def test_reserve_charges_budget_only_when_free(self):
+        scheduler = make_scheduler(requests_per_minute=60)
+        release = await scheduler.reserve(10)
+        self.assertIsNotNone(release)
+        self.assertTrue(scheduler.semaphore.locked())
+        self.assertIsNone(await scheduler.reserve(10))
+        release()
+        self.assertLess(scheduler.request_bucket.tokens, 60)
+        self.assertIsNotNone(await scheduler.reserve(10))
+
+
+class UnloadedEmbedder(HashingEmbedder):
+    loaded = False
+
+
+class BrokenEmbedder(HashingEmbedder):
+    def embed(self, texts):
+        raise RuntimeError('model crashed')
+
+
+class SemanticCacheTests(SimpleTestCase):
+    QUESTION = '거북선은 어떻게 만들었나요?'
+
+    def setUp(self):
+        patcher = mock.patch('chat.semantic_cache.time.monotonic', return_value=1000.0)
+        self.monotonic = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = SemanticCache(HashingEmbedder(dim=256), threshold=0.9, max_entries=2, ttl=60, min_chars=4)
+
+    async def remember(self, text, answer, story_id=1):
+        cached, vector = await self.cache.lookup(story_id, text)
+        self.assertIsNone(cached)
+        await self.cache.store(story_id, vector, answer)
+
+    async def test_similar_question_hits(self):
+        await self.remember(self.QUESTION, '판옥선 위에 덮개를 씌웠소.')
+        answer, _ = await self.cache.lookup(1, '거북선은 어떻게 만들었나요')
+        self.assertEqual(answer, '판옥선 위에 덮개를 씌웠소.')
+
+    async def test_different_question_or_persona_misses(self):
+        await self.remember(self.QUESTION, '판옥선 위에 덮개를 씌웠소.')
+        answer, vector = await self.cache.lookup(1, '좋아하는 음식이 무엇인가요?')
+        self.assertIsNone(answer)
+        self.assertEqual(vector.shape, (256,))
+        answer, _ = await self.cache.lookup(2, self.QUESTION)
+        self.assertIsNone(answer)
+
+    async def test_expired_entry_misses(self):
+        await self.remember(self.QUESTION, '판옥선 위에 덮개를 씌웠소.')
+        self.monotonic.return_value += 61
+        answer, _ = await self.cache.lookup(1, self.QUESTION)
+        self.assertIsNone(answer)
+        self.assertEqual(self.cache.caches[1].entries, {})
+
+    async def test_evicts_least_recently_used(self):
+        await self.remember('가장 기억에 남는 전투는?', 'first')
+        await self.remember('좋아하는 음식이 무엇인가요?', 'second')
+        # 첫 번째 항목을 다시 사용하면 두 번째 항목이 먼저 밀려난다.
+        answer, _ = await self.cache.lookup(1, '가장 기억에 남는 전투는?')
+        self.assertEqual(answer, 'first')
+        await self.remember('어릴 적 꿈은 무엇이었나요?', 'third')
+        self.assertEqual([answer for answer, _ in self.cache.caches[1].entries.values()], ['first', 'third'])
+        self.assertEqual(self.cache.caches[1].index.ntotal, 2)
+
+    async def test_embedder_failure_is_a_miss(self):
+        self.cache.embedder = BrokenEmbedder(dim=256)
+        with self.assertLogs('chat.semantic_cache', 'ERROR'):
+            self.assertEqual(await self.cache.lookup(1, self.QUESTION), (None, None))
+
+    def test_not_cacheable_until_embedder_is_loaded(self):
+        self.assertTrue(self.cache.cacheable(self.QUESTION))
+        self.assertFalse(self.cache.cacheable('안녕'))
+        self.cache.embedder = UnloadedEmbedder(dim=256)
+        self.assertFalse(self.cache.cacheable(self.QUESTION))
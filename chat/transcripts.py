@@ -0,0 +1,38 @@
+# chat/transcripts.py
+import logging, time
+from django.conf import settings
+from .history import get_redis
+from .metrics import TRANSCRIPT_EVENTS
+
+logger = logging.getLogger(__name__)
+
+
+# 대화 기록을 DB에 바로 쓰지 않고 Redis 스트림에 추가한다. (persist_transcripts 워커가 일괄 저장)
+# 스트림 추가에 실패해도 응답에는 영향을 주지 않도록 로그만 남긴다.
+async def record_transcript(story_id, session_id, messages, source):
+    config = settings.CHAT_TRANSCRIPTS
+    if not config['ENABLED']:
+        return
+
+    created_at = f'{time.time():.6f}'
+    try:
+        async with get_redis().pipeline(transaction=False) as pipe:
+            for message in messages:
+                pipe.xadd(
+                    config['STREAM'],
+                    {
+                        'story_id': str(story_id),
+                        'session_id': session_id,
+                        'role': message['role'],
+                        'content': message['content'],
+                        'source': source,
+                        'created_at': created_at,
+                    },
+                    maxlen=config['STREAM_MAXLEN'],
+                    approximate=True,
+                )
+            await pipe.execute()
+        TRANSCRIPT_EVENTS.labels('queued').inc(len(messages))
+    except Exception as e:
+        TRANSCRIPT_EVENTS.labels('dropped').inc(len(messages))
+        logger.error(f'Failed to queue transcript (Story ID {story_id}): {str(e)}')
@@ -6,8 +6,9 @@ from django_redis import get_redis_connection
 from user.models import User
 from story.models import Story
 from result.models import Result
-from django.db.models import Count, Sum
-from datetime import date, timedelta
+from django.db.models import Sum
+from datetime import date
+from .visits import count_active, count_daily_active, count_story_visitors, recent_days
 import json
 import logging
 
@@ -22,27 +23,20 @@ def cache_data(key, data):
     except Exception as e:
         logger.error(f"Error caching data: {str(e)}")
 
+# 가입자 수가 아니라 일별 활성 사용자 비트맵(VisitMiddleware/ChatConsumer가 기록)의 BITCOUNT로 방문자 수를 계산
 def update_date_visits():
     try:
         key = f"dashboard:date:visits"
 
-        today = date.today()
-        date_range = [today - timedelta(days=i) for i in range(7)]
-
-        visit_data = User.objects.filter(
-            created_at__date__in=date_range
-        ).values('created_at__date').annotate(
-            visit_total=Count('id')
-        ).order_by('created_at__date')
-
-        visit_data_dict = {visit['created_at__date']: visit['visit_total'] for visit in visit_data}
+        date_range = recent_days(7)
+        visit_totals = count_daily_active(get_redis_connection("default"), date_range)
 
         data_to_cache = [
             {
                 'date': day.strftime('%Y-%m-%d'),
-                'visit_total': str(visit_data_dict.get(day, 0))
+                'visit_total': str(visit_total)
             }
-            for day in date_range
+            for day, visit_total in zip(date_range, visit_totals)
         ]
 
         logger.info(f"Data to cache: {data_to_cache}")
@@ -52,6 +46,35 @@ def update_date_visits():
     except Exception as e:
         logger.error(f"Error updating date visit data: {str(e)}")
 
+# 주간/월간 순 방문자는 테이블을 읽지 않고 비트맵 BITOP OR, HyperLogLog PFMERGE로 합쳐서 계산
+def update_unique_visits():
+    try:
+        key = "dashboard:unique:visits"
+        redis_conn = get_redis_connection("default")
+
+        periods = {'daily': recent_days(1), 'weekly': recent_days(7), 'monthly': recent_days(30)}
+
+        data_to_cache = {
+            period: str(count_active(redis_conn, days))
+            for period, days in periods.items()
+        }
+        data_to_cache['stories'] = [
+            {
+                'name': story['name'],
+                **{
+                    period: str(count_story_visitors(redis_conn, story['id'], days))
+                    for period, days in periods.items()
+                }
+            }
+            for story in Story.objects.filter(is_deleted=False).values('id', 'name')
+        ]
+
+        logger.info(f"Data to cache: {data_to_cache}")
+
+        cache_data(key, data_to_cache)
+    except Exception as e:
+        logger.error(f"Error updating unique visit data: {str(e)}")
+
 def update_age_visits():
     try:
         key = f"dashboard:age:visits"
@@ -162,6 +185,13 @@ def start():
         max_instances=1,
         replace_existing=True,
     )
+    scheduler.add_job(
+        update_unique_visits,
+        trigger=IntervalTrigger(seconds=1000),
+        id="update_unique_visits",
+        max_instances=1,
+        replace_existing=True,
+    )
     scheduler.add_job(
         update_age_visits,
         trigger=IntervalTrigger(seconds=1000),
@@ -188,6 +218,7 @@ def start():
     logger.info("Scheduler started!")
 
     update_date_visits()
+    update_unique_visits()
     update_age_visits()
     update_chat_visits()
     update_correct_rate()
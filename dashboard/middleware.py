@@ -0,0 +1,27 @@
+# dashboard/middleware.py
+import logging
+from django_redis import get_redis_connection
+from .visits import record_visit
+
+logger = logging.getLogger(__name__)
+
+
+# URL에 user_id가 있는 요청이 성공하면 일별 활성 사용자 비트맵에, story_id도 있으면 위인별 방문자 HyperLogLog에 기록
+class VisitMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        visit = getattr(request, 'visit', None)
+        if visit is not None and response.status_code < 400:
+            try:
+                record_visit(get_redis_connection("default"), *visit)
+            except Exception as e:
+                logger.error(f"Failed to record visit {visit}: {str(e)}")
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        user_id = view_kwargs.get('user_id')
+        if user_id is not None:
+            request.visit = (user_id, view_kwargs.get('story_id'))
@@ -53,6 +53,58 @@ class DateVisitsAPIView(APIView):
             return Response({"detail": "서버에서 데이터를 가져오는 중 오류가 발생했습니다."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class UniqueVisitsAPIView(APIView):
+    @swagger_auto_schema(
+        operation_id="순 방문자 수 통계내기",
+        operation_description="Redis 비트맵/HyperLogLog를 통해 일간/주간/월간 순 방문자 수와 위인별 순 방문자 수 통계내기 (로그인 사용자 기준, 익명 세션 제외)",
+        responses={
+            200: openapi.Response(
+                description="성공",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'daily': openapi.Schema(type=openapi.TYPE_STRING, description='오늘 순 방문자 수'),
+                        'weekly': openapi.Schema(type=openapi.TYPE_STRING, description='최근 7일 순 방문자 수'),
+                        'monthly': openapi.Schema(type=openapi.TYPE_STRING, description='최근 30일 순 방문자 수'),
+                        'stories': openapi.Schema(
+                            type=openapi.TYPE_ARRAY,
+                            items=openapi.Schema(
+                                type=openapi.TYPE_OBJECT,
+                                properties={
+                                    'name': openapi.Schema(type=openapi.TYPE_STRING, description='위인 이름'),
+                                    'daily': openapi.Schema(type=openapi.TYPE_STRING, description='오늘 순 방문자 수'),
+                                    'weekly': openapi.Schema(type=openapi.TYPE_STRING, description='최근 7일 순 방문자 수'),
+                                    'monthly': openapi.Schema(type=openapi.TYPE_STRING, description='최근 30일 순 방문자 수')
+                                }
+                            )
+                        )
+                    }
+                )
+            )
+        }
+    )
+    def get(self, request, format=None):
+        try:
+            logger.info("UniqueVisitsAPIView GET request initiated.")
+
+            redis_conn = get_redis_connection("default")
+            redis_key = "dashboard:unique:visits"
+            logger.debug(f"Fetching data from Redis with key: {redis_key}")
+            cached_data = redis_conn.get(redis_key)
+
+            if cached_data:
+                visit_data = json.loads(cached_data)
+                logger.info("Cached data found for unique visits.")
+                return Response(visit_data, status=status.HTTP_200_OK)
+            else:
+                logger.warning("No cached data found for unique visits.")
+                return Response({"detail": "캐싱된 순 방문자 수 데이터가 없습니다."}, status=status.HTTP_404_NOT_FOUND)
+
+        except Exception as e:
+            logger.error(f"Error in UniqueVisitsAPIView GET request: {str(e)}")
+            return Response({"detail": "서버에서 데이터를 가져오는 중 오류가 발생했습니다."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 class AgeVisitsAPIView(APIView):
     @swagger_auto_schema(
         operation_id="나이별 가입자 수 통계내기",
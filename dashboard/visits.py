@@ -0,0 +1,118 @@
+# dashboard/visits.py
+import logging, re, threading, time, uuid
+from datetime import date, timedelta
+from django.conf import settings
+from django.db.models import Max
+from story.catalog import story_catalog
+from user.models import User
+
+logger = logging.getLogger(__name__)
+
+ID_PATTERN = re.compile(r'[0-9]+')
+
+# 방문 기록은 트래픽과 관계없이 크기가 고정된다.
+# - 일별 활성 사용자: user_id를 비트 위치로 쓰는 비트맵 (사용자 수/8 바이트)
+# - 위인별 순 방문자: 위인/날짜별 HyperLogLog (키당 최대 12KB, 오차 약 0.81%)
+# 순 방문자는 가입된 사용자(user_id) 기준이다. 익명 세션은 연결마다 새 방문자가 되므로 세지 않는다.
+
+
+def dau_key(day):
+    return f"visits:dau:{day:%Y%m%d}"
+
+
+def story_visitors_key(story_id, day):
+    return f"visits:story:{story_id}:{day:%Y%m%d}"
+
+
+def recent_days(days, today=None):
+    today = today or date.today()
+    return [today - timedelta(days=i) for i in range(days)]
+
+
+def retention_seconds():
+    return settings.VISITS_RETENTION_DAYS * 24 * 60 * 60
+
+
+# 요청 값으로 비트맵 오프셋이나 HyperLogLog 키가 끝없이 늘지 않도록
+# 현재 최대 User.pk 이하의 user_id와 위인 카탈로그에 있는 story_id만 통과시킨다. (DB/Redis를 사용하므로 동기 코드에서 호출)
+class VisitFilter:
+    def __init__(self, refresh_interval):
+        self.refresh_interval = refresh_interval
+        self.max_user_id = 0
+        self.refreshed_at = None
+        self.lock = threading.Lock()
+
+    # 캐시된 최대값보다 큰 user_id는 새로 가입한 사용자일 수 있으므로 refresh_interval마다 한 번만 DB에서 다시 확인
+    def _refresh(self):
+        with self.lock:
+            if self.refreshed_at is None or time.monotonic() - self.refreshed_at >= self.refresh_interval:
+                self.max_user_id = User.objects.aggregate(max_id=Max('pk'))['max_id'] or 0
+                self.refreshed_at = time.monotonic()
+
+    def known_user_ids(self, user_ids):
+        user_ids = {int(user_id) for user_id in user_ids}
+        if any(user_id > self.max_user_id for user_id in user_ids):
+            self._refresh()
+        return {user_id for user_id in user_ids if 0 < user_id <= self.max_user_id}
+
+    # 숫자가 아닌 story_id(채팅 경로는 \w+를 허용)는 해당 항목만 버린다.
+    def known_story_ids(self, story_ids):
+        details = story_catalog.get().details
+        return {story_id for story_id in story_ids if ID_PATTERN.fullmatch(str(story_id)) and int(story_id) in details}
+
+
+visit_filter = VisitFilter(settings.VISITS_USER_ID_REFRESH_INTERVAL)
+
+
+# 파이프라인에 방문 기록 명령을 추가 (동기/비동기 클라이언트 공용, 값은 VisitFilter로 거른 뒤 전달)
+def add_visit_commands(pipe, day, user_ids=(), story_visitors=None):
+    ttl = retention_seconds()
+    if user_ids:
+        key = dau_key(day)
+        for user_id in user_ids:
+            pipe.setbit(key, int(user_id), 1)
+        pipe.expire(key, ttl)
+    for story_id, visitors in (story_visitors or {}).items():
+        key = story_visitors_key(story_id, day)
+        pipe.pfadd(key, *visitors)
+        pipe.expire(key, ttl)
+
+
+def record_visit(redis_conn, user_id, story_id=None):
+    if not visit_filter.known_user_ids([user_id]):
+        return
+    if story_id is not None and not visit_filter.known_story_ids([story_id]):
+        story_id = None
+    with redis_conn.pipeline(transaction=False) as pipe:
+        add_visit_commands(
+            pipe, date.today(), [user_id],
+            {story_id: [f"user:{user_id}"]} if story_id is not None else None,
+        )
+        pipe.execute()
+
+
+def count_daily_active(redis_conn, days):
+    with redis_conn.pipeline(transaction=False) as pipe:
+        for day in days:
+            pipe.bitcount(dau_key(day))
+        return pipe.execute()
+
+
+# 여러 날의 비트맵을 BITOP OR로 합쳐 기간 내 순 활성 사용자 수를 센다.
+def count_active(redis_conn, days):
+    tmp_key = f"visits:tmp:{uuid.uuid4().hex}"
+    with redis_conn.pipeline(transaction=True) as pipe:
+        pipe.bitop('OR', tmp_key, *[dau_key(day) for day in days])
+        pipe.bitcount(tmp_key)
+        pipe.delete(tmp_key)
+        return pipe.execute()[1]
+
+
+# 여러 날의 HyperLogLog를 PFMERGE로 합쳐 기간 내 위인별 순 방문자 수를 추정한다.
+def count_story_visitors(redis_conn, story_id, days):
+    tmp_key = f"visits:tmp:{uuid.uuid4().hex}"
+    with redis_conn.pipeline(transaction=True) as pipe:
+        pipe.pfmerge(tmp_key, *[story_visitors_key(story_id, day) for day in days])
+        pipe.pfcount(tmp_key)
+        pipe.delete(tmp_key)
+        return pipe.execute()[1]
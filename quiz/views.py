@@ -5,6 +5,7 @@ from rest_framework import status
 from story.models import Story
 from .models import Quiz
 from result.models import Result
+from story.progress import invalidate_user_progress
 from user.models import User
 from .serializers import QuizSerializer, UpdateResultSerializer
 
@@ -134,6 +135,7 @@ class UpdateQuizResult(APIView):
                 result.puzzle_cnt += 1
                 logger.info(f"Updated result: correct_cnt={result.correct_cnt}, puzzle_cnt={result.puzzle_cnt}")
             result.save()
+            invalidate_user_progress(user.id)
             return Response({"puzzle_cnt": result.puzzle_cnt}, status=status.HTTP_200_OK)
         else:
             logger.error(f"Serializer errors: {serializer.errors}")
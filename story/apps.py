@@ -6,6 +6,7 @@ class StoryConfig(AppConfig):
     name = 'story'
 
     def ready(self):
+        from . import signals
         if os.environ.get('RUN_MAIN', None) is not None:
             print(' RUN_MAIN :', os.environ.get('RUN_MAIN', None))
             from . import jobs
@@ -0,0 +1,135 @@
+# story/catalog.py
+import hashlib, json, logging, threading, time
+from django.conf import settings
+from django_redis import get_redis_connection
+from .models import Story
+from .serializers import GreatDetailSerializer, GreatsSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def content_digest(data):
+    text = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+# 응답 본문을 결정하는 값들로 만든 strong ETag (같은 값이면 같은 본문)
+def make_etag(*parts):
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\x00')
+    return f'"{digest.hexdigest()}"'
+
+
+def etag_matches(request, etag):
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    tags = [tag.strip().removeprefix('W/') for tag in header.split(',')]
+    return '*' in tags or etag in tags
+
+
+# 한 버전의 위인 카탈로그, 직렬화된 목록과 나라/분야별 목록, 상세 정보를 미리 만들어 둔다.
+class Catalog:
+    def __init__(self, version, stories, details):
+        self.version = version
+        self.views = {}
+        for entry in stories:
+            for key in ((None, None), (entry['nation'], None), (None, entry['field']), (entry['nation'], entry['field'])):
+                self.views.setdefault(key, []).append(entry)
+        self.view_digests = {key: content_digest(entries) for key, entries in self.views.items()}
+        self.empty_digest = content_digest([])
+        self.details = {int(story_id): detail for story_id, detail in details.items()}
+        self.detail_etags = {story_id: make_etag(content_digest(detail)) for story_id, detail in self.details.items()}
+
+    # 퍼즐 개수(puzzle_cnt)는 사용자마다 다르므로 0으로 채워진 공용 항목을 돌려준다.
+    def entries(self, nation=None, field=None):
+        key = (nation or None, field or None)
+        return self.views.get(key, []), self.view_digests.get(key, self.empty_digest)
+
+    def detail(self, story_id):
+        return self.details.get(story_id), self.detail_etags.get(story_id)
+
+
+def build_catalog_data():
+    stories = list(Story.objects.filter(is_deleted=False).order_by('id'))
+    return {
+        'stories': [dict(entry) for entry in GreatsSerializer(stories, many=True, context={'progress': {}}).data],
+        'details': {str(story.id): dict(GreatDetailSerializer(story).data) for story in stories},
+    }
+
+
+# 프로세스 메모리에 현재 버전의 카탈로그를 두고, Redis의 버전 키가 바뀌면
+# Redis에 저장된 같은 버전의 카탈로그(없으면 DB)에서 다시 만든다.
+class CatalogCache:
+    def __init__(self, version_key, check_interval, ttl):
+        self.version_key = version_key
+        self.check_interval = check_interval
+        self.ttl = ttl
+        self.catalog = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+    def data_key(self, version):
+        return f"story:catalog:data:{version}"
+
+    def get(self):
+        catalog = self.catalog
+        if catalog is not None and time.monotonic() - self.checked_at < self.check_interval:
+            return catalog
+
+        with self.lock:
+            now = time.monotonic()
+            if self.catalog is not None and now - self.checked_at < self.check_interval:
+                return self.catalog
+            self.checked_at = now
+
+            try:
+                version = get_redis_connection("default").get(self.version_key)
+                version = version.decode() if version else '0'
+            except Exception as e:
+                logger.error(f"Failed to read story catalog version from Redis: {str(e)}")
+                if self.catalog is not None:
+                    return self.catalog
+                version = None
+
+            if self.catalog is None or version != self.catalog.version:
+                self.catalog = self.load(version)
+            return self.catalog
+
+    def load(self, version):
+        if version is not None:
+            try:
+                cached = get_redis_connection("default").get(self.data_key(version))
+                if cached is not None:
+                    logger.info(f"Loaded story catalog version {version} from Redis")
+                    return Catalog(version, **json.loads(cached))
+            except Exception as e:
+                logger.error(f"Failed to read story catalog from Redis: {str(e)}")
+
+        data = build_catalog_data()
+        if version is not None:
+            try:
+                get_redis_connection("default").set(self.data_key(version), json.dumps(data, ensure_ascii=False), ex=self.ttl)
+            except Exception as e:
+                logger.error(f"Failed to cache story catalog: {str(e)}")
+        logger.info(f"Built story catalog version {version} with {len(data['stories'])} stories")
+        return Catalog(version, **data)
+
+    # 버전을 올려 모든 프로세스가 다음 확인 때 새 카탈로그를 만들게 한다.
+    def invalidate(self):
+        try:
+            version = get_redis_connection("default").incr(self.version_key)
+            logger.info(f"Story catalog version bumped to {version}")
+        except Exception as e:
+            logger.error(f"Failed to bump story catalog version: {str(e)}")
+            self.catalog = None
+        self.checked_at = 0.0
+
+
+story_catalog = CatalogCache(
+    settings.STORY_CATALOG_VERSION_KEY,
+    settings.STORY_CATALOG_RELOAD_INTERVAL,
+    settings.STORY_CATALOG_CACHE_TTL,
+)
@@ -3,30 +3,100 @@ from django_apscheduler.jobstores import DjangoJobStore, register_events
 from apscheduler.triggers.interval import IntervalTrigger
 from django_apscheduler.models import DjangoJobExecution
 from django_redis import get_redis_connection
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BigIntegerField, Case, F, Value, When
+from django.utils import timezone
 from story.models import Story
+import redis
 import logging
 
 logger = logging.getLogger(__name__)
 
-def update_access_counts():
+# 이전 방식(story:<id>:access_cnt 개별 키)으로 쌓인 접속 수를 삭제와 동시에 반영 대기 해시로 옮긴다.
+FOLD_LEGACY_SCRIPT = """
+local count = redis.call('GET', KEYS[2])
+if count then
+    redis.call('DEL', KEYS[2])
+    redis.call('HINCRBY', KEYS[1], ARGV[1], count)
+end
+return count
+"""
+LEGACY_ACCESS_COUNT_PATTERN = "story:*:access_cnt"
+
+
+# 접속 수 해시를 반영 대기 키로 RENAME하여 원자적으로 가져오고 (이후 증가분은 새 해시에 쌓인다),
+# 남아 있는 개별 키는 KEYS 대신 SCAN으로 찾아 같은 해시로 옮긴다.
+# 반영 대기 키는 DB 반영이 커밋된 뒤에만 삭제하므로 실패하거나 중간에 종료되면 다음 실행에서 다시 반영된다.
+def collect_access_counts(redis_conn, key, legacy_pattern=LEGACY_ACCESS_COUNT_PATTERN, scan_count=1000):
+    flushing_key = f"{key}:flushing"
     try:
-        redis_conn = get_redis_connection("default")
+        if not redis_conn.renamenx(key, flushing_key):
+            logger.warning(f"Previous access count flush did not finish, retrying {flushing_key} first")
+    except redis.ResponseError:
+        pass  # 새로 쌓인 접속 수가 없음
+
+    fold = redis_conn.register_script(FOLD_LEGACY_SCRIPT)
+    for keys in iter_scan(redis_conn, legacy_pattern, scan_count):
+        with redis_conn.pipeline(transaction=False) as pipe:
+            for legacy_key in keys:
+                fold(keys=[flushing_key, legacy_key], args=[legacy_key.rsplit(b':', 2)[-2]], client=pipe)
+            pipe.execute()
+
+    counts = {}
+    for story_id, count in redis_conn.hgetall(flushing_key).items():
+        try:
+            counts[int(story_id)] = int(count)
+        except ValueError:
+            logger.error(f"Skipping invalid access count {story_id}={count}")
+    return flushing_key, counts
 
-        keys = redis_conn.keys("story:*:access_cnt")
 
-        for key in keys:
-            story_id = key.split(b':')[1].decode('utf-8')
-            access_count = int(redis_conn.get(key))
+def iter_scan(redis_conn, pattern, count):
+    cursor = 0
+    while True:
+        cursor, keys = redis_conn.scan(cursor, match=pattern, count=count)
+        if keys:
+            yield keys
+        if cursor == 0:
+            return
 
-            story = Story.objects.filter(pk=story_id, is_deleted=False).first()
-            if story:
-                story.access_cnt += access_count
-                story.save()
 
-                redis_conn.delete(key)
-                logger.info(f"Access count for story_id {story_id} updated to {story.access_cnt} in the database")
-            else:
-                logger.error(f"Story with id {story_id} not found.")
+# 모든 증가분을 한 트랜잭션에서 CASE 식의 UPDATE로 반영, 반영된 story_id 집합을 돌려준다.
+def apply_access_counts(counts, chunk_size=1000):
+    story_ids = sorted(counts)
+    updated = set()
+    now = timezone.now()
+    with transaction.atomic():
+        for i in range(0, len(story_ids), chunk_size):
+            chunk = list(
+                Story.objects.filter(pk__in=story_ids[i:i + chunk_size], is_deleted=False)
+                .values_list('pk', flat=True)
+            )
+            if not chunk:
+                continue
+            delta = Case(
+                *[When(pk=story_id, then=Value(counts[story_id])) for story_id in chunk],
+                default=Value(0),
+                output_field=BigIntegerField(),
+            )
+            # QuerySet.update는 post_save를 보내지 않으므로 위인 카탈로그 버전도 바뀌지 않는다.
+            Story.objects.filter(pk__in=chunk).update(access_cnt=F('access_cnt') + delta, updated_at=now)
+            updated.update(chunk)
+    return updated
+
+
+def update_access_counts():
+    try:
+        redis_conn = get_redis_connection("default")
+        flushing_key, counts = collect_access_counts(redis_conn, settings.STORY_ACCESS_COUNT_KEY)
+        if counts:
+            updated = apply_access_counts(counts)
+            missing = set(counts) - updated
+            if missing:
+                logger.error(f"Dropped access counts for missing stories: {sorted(missing)}")
+            logger.info(f"Access counts for {len(updated)} stories updated in the database")
+        redis_conn.delete(flushing_key)
 
     except Exception as e:
         logger.error(f"Failed to update access counts from Redis to the database: {str(e)}")
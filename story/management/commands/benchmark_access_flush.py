@@ -0,0 +1,143 @@
+# story/management/commands/benchmark_access_flush.py
+import random, threading, time, uuid
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
+from django_redis import get_redis_connection
+from story.jobs import apply_access_counts, collect_access_counts, iter_scan
+from story.models import Story
+
+
+class Command(BaseCommand):
+    help = '접속 수 반영 작업을 이전 방식(KEYS + 위인별 save)과 현재 방식(RENAME/SCAN + 일괄 UPDATE)으로 비교합니다. (임시 위인은 롤백되고 Redis는 별도 prefix를 사용)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keys', type=int, default=10000, help='접속 수가 쌓인 위인 수')
+        parser.add_argument('--hits', type=int, default=5, help='위인별로 미리 쌓아둘 접속 수')
+        parser.add_argument('--noise', type=int, default=100000, help='KEYS 비용 확인용으로 함께 둘 관계없는 키 수')
+        parser.add_argument('--writers', type=int, default=2, help='반영 중에도 접속 수를 올리는 스레드 수')
+
+    def handle(self, *args, **options):
+        redis_conn = get_redis_connection("default")
+        prefix = f"bench:{uuid.uuid4().hex[:8]}"
+        results = []
+        try:
+            with redis_conn.pipeline(transaction=False) as pipe:
+                for i in range(options['noise']):
+                    pipe.set(f"{prefix}:noise:{i}", 1)
+                pipe.execute()
+            for mode in ('legacy', 'current'):
+                results.append(self.run(mode, redis_conn, prefix, options))
+        finally:
+            for keys in iter_scan(redis_conn, f"{prefix}:*", 1000):
+                redis_conn.unlink(*keys)
+
+        for result in results:
+            self.stdout.write(
+                f"{result['mode']:8} 반영 {result['seconds']:.3f}초, DB 쿼리 {result['queries']}개, "
+                f"Redis 단일 명령 최대 {result['blocking_ms']:.1f}ms, "
+                f"접속 수 {result['expected']}개 중 유실 {result['lost']}개 (남은 증가분 {result['remaining']}개)"
+            )
+
+    def run(self, mode, redis_conn, prefix, options):
+        hash_key = f"{prefix}:{mode}:access_cnt"
+        legacy_pattern = f"{prefix}:{mode}:story:*:access_cnt"
+        marker = f"b{uuid.uuid4().hex[:9]}"
+
+        def legacy_key(story_id):
+            return f"{prefix}:{mode}:story:{story_id}:access_cnt"
+
+        with transaction.atomic():
+            Story.objects.bulk_create([
+                Story(name=marker, front_url='', back_url='', saying_url='', saying='', nation='', field='',
+                      video_url='', gender=0, life='', information_url='')
+                for _ in range(options['keys'])
+            ])
+            story_ids = list(Story.objects.filter(name=marker).values_list('pk', flat=True))
+
+            with redis_conn.pipeline(transaction=False) as pipe:
+                for story_id in story_ids:
+                    if mode == 'legacy':
+                        pipe.set(legacy_key(story_id), options['hits'])
+                    else:
+                        pipe.hset(hash_key, story_id, options['hits'])
+                pipe.execute()
+
+            # 반영 도중에 들어오는 접속 수 (유실 여부 확인용)
+            stop = threading.Event()
+            written = [0] * options['writers']
+
+            def write(index):
+                rng = random.Random(index)
+                while not stop.is_set():
+                    story_id = rng.choice(story_ids)
+                    if mode == 'legacy':
+                        redis_conn.incr(legacy_key(story_id))
+                    else:
+                        redis_conn.hincrby(hash_key, story_id, 1)
+                    written[index] += 1
+
+            writers = [threading.Thread(target=write, args=(index,), daemon=True) for index in range(options['writers'])]
+            for writer in writers:
+                writer.start()
+
+            started_at = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                if mode == 'legacy':
+                    blocking = self.flush_legacy(redis_conn, legacy_pattern)
+                else:
+                    blocking = self.max_scan_seconds(redis_conn, legacy_pattern)
+                    flushing_key, counts = collect_access_counts(redis_conn, hash_key, legacy_pattern)
+                    apply_access_counts(counts)
+                    redis_conn.delete(flushing_key)
+            seconds = time.perf_counter() - started_at
+
+            stop.set()
+            for writer in writers:
+                writer.join()
+
+            applied = Story.objects.filter(name=marker).aggregate(total=Sum('access_cnt'))['total'] or 0
+            if mode == 'legacy':
+                remaining = sum(
+                    int(redis_conn.get(key) or 0)
+                    for keys in iter_scan(redis_conn, legacy_pattern, 1000) for key in keys
+                )
+            else:
+                remaining = sum(int(count) for count in redis_conn.hvals(hash_key))
+            expected = len(story_ids) * options['hits'] + sum(written)
+            transaction.set_rollback(True)
+
+        return {
+            'mode': mode,
+            'seconds': seconds,
+            'queries': len(queries.captured_queries),
+            'blocking_ms': blocking * 1000,
+            'expected': expected,
+            'remaining': remaining,
+            'lost': expected - applied - remaining,
+        }
+
+    # 기존 story/jobs.update_access_counts와 같은 방식
+    def flush_legacy(self, redis_conn, pattern):
+        started_at = time.perf_counter()
+        keys = redis_conn.keys(pattern)
+        blocking = time.perf_counter() - started_at
+        for key in keys:
+            story_id = key.rsplit(b':', 2)[-2].decode('utf-8')
+            access_count = int(redis_conn.get(key))
+            story = Story.objects.filter(pk=story_id, is_deleted=False).first()
+            if story:
+                story.access_cnt += access_count
+                story.save()
+                redis_conn.delete(key)
+        return blocking
+
+    def max_scan_seconds(self, redis_conn, pattern):
+        slowest, cursor = 0.0, 0
+        while True:
+            started_at = time.perf_counter()
+            cursor, _ = redis_conn.scan(cursor, match=pattern, count=1000)
+            slowest = max(slowest, time.perf_counter() - started_at)
+            if cursor == 0:
+                return slowest
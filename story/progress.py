@@ -0,0 +1,40 @@
+# story/progress.py
+import json, logging
+from django.conf import settings
+from django_redis import get_redis_connection
+from result.models import Result
+
+logger = logging.getLogger(__name__)
+
+
+def progress_key(user_id):
+    return f"user:{user_id}:progress"
+
+
+# 사용자의 위인별 퍼즐 개수 {story_id: puzzle_cnt}, 위인 수와 관계없이 Redis 조회 1번 또는 DB 쿼리 1번
+def get_user_progress(user_id):
+    key = progress_key(user_id)
+    try:
+        cached = get_redis_connection("default").get(key)
+        if cached is not None:
+            return {int(story_id): puzzle_cnt for story_id, puzzle_cnt in json.loads(cached).items()}
+    except Exception as e:
+        logger.error(f"Failed to read progress cache for user_id {user_id}: {str(e)}")
+
+    progress = {}
+    # 같은 위인의 결과가 여러 개이면 기존처럼 가장 먼저 만들어진 결과를 사용
+    for story_id, puzzle_cnt in Result.objects.filter(user_id=user_id).order_by('id').values_list('story_id', 'puzzle_cnt'):
+        progress.setdefault(story_id, puzzle_cnt)
+
+    try:
+        get_redis_connection("default").set(key, json.dumps(progress), ex=settings.STORY_PROGRESS_CACHE_TTL)
+    except Exception as e:
+        logger.error(f"Failed to cache progress for user_id {user_id}: {str(e)}")
+    return progress
+
+
+def invalidate_user_progress(user_id):
+    try:
+        get_redis_connection("default").delete(progress_key(user_id))
+    except Exception as e:
+        logger.error(f"Failed to invalidate progress cache for user_id {user_id}: {str(e)}")
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from .models import Story
-from result.models import Result
+from .progress import get_user_progress
 from django.conf import settings
 
 class GreatsSerializer(serializers.ModelSerializer):
@@ -15,13 +15,15 @@ class GreatsSerializer(serializers.ModelSerializer):
         fields = ['greatId', 'name', 'front_url', 'back_url', 'saying', 'puzzle_cnt', 'saying',
                   'saying_url', 'nation', 'field']
 
+    # 위인마다 쿼리하지 않고 목록 전체에서 한 번 불러온 진행도를 사용
     def get_puzzle_cnt(self, obj):
-        user_id = self.context.get('user_id')
-        if user_id is not None:
-            result = Result.objects.filter(story=obj, user_id=user_id).first()
-            if result:
-                return result.puzzle_cnt
-        return 0
+        progress = self.context.get('progress')
+        if progress is None:
+            user_id = self.context.get('user_id')
+            if user_id is None:
+                return 0
+            progress = self.context['progress'] = get_user_progress(user_id)
+        return progress.get(obj.id, 0)
 
     def get_front_url(self, obj):
         return self.get_s3_url(obj.front_url)
@@ -0,0 +1,22 @@
+# story/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .catalog import story_catalog
+from .models import Story
+
+# 카탈로그에 나오지 않는 필드만 바뀐 경우 (접속 수 반영 작업 등)
+CATALOG_IGNORED_FIELDS = {'access_cnt', 'updated_at'}
+
+
+@receiver(post_save, sender=Story)
+def story_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= CATALOG_IGNORED_FIELDS:
+        return
+    # 커밋 전에 버전을 올리면 다른 프로세스가 이전 데이터로 새 버전을 만들 수 있다.
+    transaction.on_commit(story_catalog.invalidate)
+
+
+@receiver(post_delete, sender=Story)
+def story_deleted(sender, instance, **kwargs):
+    transaction.on_commit(story_catalog.invalidate)
@@ -1,3 +1,169 @@
+from unittest import mock
+import fakeredis
+import redis
 from django.test import TestCase
+from rest_framework.test import APIRequestFactory
+from result.models import Result
+from story.catalog import CatalogCache
+from story.jobs import apply_access_counts, collect_access_counts, update_access_counts
+from story.models import Story
+from story.progress import get_user_progress, invalidate_user_progress
+from story.views import GreatsList
+from user.models import User
 
-# Create your tests here.
+KEY = 'story:access_cnt'
+
+
+def create_story(name, access_cnt=0, is_deleted=False):
+    return Story.objects.create(
+        name=name, front_url='', back_url='', saying_url='', saying='', nation='', field='', video_url='',
+        gender=0, life='', information_url='', access_cnt=access_cnt, is_deleted=is_deleted,
+    )
+
+
+class CollectAccessCountsTests(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+
+    def test_moves_counts_to_flushing_key(self):
+        self.redis.hincrby(KEY, 1, 3)
+        self.redis.hincrby(KEY, 2, 1)
+        flushing_key, counts = collect_access_counts(self.redis, KEY)
+        self.assertEqual(flushing_key, f'{KEY}:flushing')
+        self.assertEqual(counts, {1: 3, 2: 1})
+        self.assertFalse(self.redis.exists(KEY))
+        # 가져온 뒤의 증가분은 새 해시에 쌓인다.
+        self.redis.hincrby(KEY, 1, 1)
+        self.assertEqual(self.redis.hgetall(flushing_key), {b'1': b'3', b'2': b'1'})
+
+    def test_folds_legacy_keys(self):
+        self.redis.hincrby(KEY, 1, 3)
+        self.redis.set('story:1:access_cnt', 2)
+        self.redis.set('story:5:access_cnt', 4)
+        _, counts = collect_access_counts(self.redis, KEY, scan_count=1)
+        self.assertEqual(counts, {1: 5, 5: 4})
+        self.assertEqual(self.redis.keys('story:*:access_cnt'), [])
+
+    def test_retries_unfinished_flush_first(self):
+        self.redis.hincrby(f'{KEY}:flushing', 1, 2)
+        self.redis.hincrby(KEY, 1, 7)
+        with self.assertLogs('story.jobs', 'WARNING'):
+            _, counts = collect_access_counts(self.redis, KEY)
+        self.assertEqual(counts, {1: 2})
+        self.assertEqual(self.redis.hgetall(KEY), {b'1': b'7'})
+
+    def test_empty(self):
+        flushing_key, counts = collect_access_counts(self.redis, KEY)
+        self.assertEqual(counts, {})
+        self.assertFalse(self.redis.exists(flushing_key))
+
+    def test_skips_invalid_fields(self):
+        self.redis.hset(KEY, mapping={'1': 2, 'abc': 3})
+        with self.assertLogs('story.jobs', 'ERROR'):
+            _, counts = collect_access_counts(self.redis, KEY)
+        self.assertEqual(counts, {1: 2})
+
+
+class ApplyAccessCountsTests(TestCase):
+    def test_adds_counts_to_existing_stories(self):
+        first = create_story('first', access_cnt=10)
+        second = create_story('second')
+        deleted = create_story('deleted', access_cnt=1, is_deleted=True)
+        counts = {first.pk: 5, second.pk: 2, deleted.pk: 3, 9999: 1}
+        # 삭제되었거나 없는 위인만 있는 묶음은 UPDATE를 건너뛴다.
+        with self.assertNumQueries(5):
+            updated = apply_access_counts(counts, chunk_size=2)
+        self.assertEqual(updated, {first.pk, second.pk})
+        first.refresh_from_db()
+        second.refresh_from_db()
+        deleted.refresh_from_db()
+        self.assertEqual((first.access_cnt, second.access_cnt, deleted.access_cnt), (15, 2, 1))
+
+    def test_update_access_counts_clears_flushing_key_after_commit(self):
+        story = create_story('story', access_cnt=1)
+        redis_conn = fakeredis.FakeRedis()
+        redis_conn.hincrby(KEY, story.pk, 4)
+        redis_conn.set(f'story:{story.pk}:access_cnt', 1)
+        with mock.patch('story.jobs.get_redis_connection', return_value=redis_conn), self.assertLogs('story.jobs', 'INFO'):
+            update_access_counts()
+        story.refresh_from_db()
+        self.assertEqual(story.access_cnt, 6)
+        self.assertEqual(redis_conn.keys('*'), [])
+
+    def test_update_access_counts_keeps_flushing_key_on_failure(self):
+        story = create_story('story')
+        redis_conn = fakeredis.FakeRedis()
+        redis_conn.hincrby(KEY, story.pk, 4)
+        with mock.patch('story.jobs.get_redis_connection', return_value=redis_conn), \
+                mock.patch('story.jobs.apply_access_counts', side_effect=RuntimeError('db down')), \
+                self.assertLogs('story.jobs', 'ERROR'):
+            update_access_counts()
+        self.assertEqual(redis_conn.hgetall(f'{KEY}:flushing'), {str(story.pk).encode(): b'4'})
+
+
+class ProgressTestCase(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        for target in ('story.progress.get_redis_connection', 'story.catalog.get_redis_connection'):
+            patcher = mock.patch(target, return_value=self.redis)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user = User.objects.create(username='tester', year=2010)
+        self.first = create_story('first')
+        self.second = create_story('second')
+        Result.objects.create(story=self.first, user=self.user, puzzle_cnt=3, correct_cnt=3)
+        # 같은 위인의 결과가 여러 개이면 가장 먼저 만들어진 결과를 사용
+        Result.objects.create(story=self.first, user=self.user, puzzle_cnt=1, correct_cnt=1)
+
+
+class UserProgressTests(ProgressTestCase):
+    def test_caches_progress_after_one_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(get_user_progress(self.user.id), {self.first.pk: 3})
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_progress(self.user.id), {self.first.pk: 3})
+
+    def test_invalidate_reloads_from_database(self):
+        get_user_progress(self.user.id)
+        Result.objects.create(story=self.second, user=self.user, puzzle_cnt=2, correct_cnt=0)
+        self.assertEqual(get_user_progress(self.user.id), {self.first.pk: 3})
+        invalidate_user_progress(self.user.id)
+        self.assertEqual(get_user_progress(self.user.id), {self.first.pk: 3, self.second.pk: 2})
+
+    def test_falls_back_to_database_when_redis_is_down(self):
+        self.redis.get = mock.Mock(side_effect=redis.ConnectionError('down'))
+        self.redis.set = mock.Mock(side_effect=redis.ConnectionError('down'))
+        with self.assertLogs('story.progress', 'ERROR') as logs:
+            self.assertEqual(get_user_progress(self.user.id), {self.first.pk: 3})
+        self.assertEqual(len(logs.output), 2)
+
+
+class GreatsListTests(ProgressTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch('story.views.story_catalog', CatalogCache('story:catalog:version', 60, 60))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.factory = APIRequestFactory()
+
+    def get(self, **headers):
+        request = self.factory.get('/api/greats/', headers=headers)
+        return GreatsList.as_view()(request, user_id=self.user.id)
+
+    def test_list_needs_no_queries_once_cached(self):
+        with self.assertLogs('story.catalog', 'INFO'):
+            self.get()
+        with self.assertNumQueries(0):
+            response = self.get()
+        self.assertEqual([(entry['greatId'], entry['puzzle_cnt']) for entry in response.data],
+                         [(self.first.pk, 3), (self.second.pk, 0)])
+
+    def test_not_modified_until_progress_changes(self):
+        with self.assertLogs('story.catalog', 'INFO'):
+            etag = self.get()['ETag']
+        self.assertEqual(self.get(If_None_Match=etag).status_code, 304)
+        Result.objects.create(story=self.second, user=self.user, puzzle_cnt=2, correct_cnt=0)
+        invalidate_user_progress(self.user.id)
+        response = self.get(If_None_Match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
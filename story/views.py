@@ -1,9 +1,10 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
-from .models import Story
+from .catalog import etag_matches, make_etag, story_catalog
+from .progress import get_user_progress
 from .serializers import GreatsSerializer, GreatDetailSerializer
-from django_redis import get_redis_connection
+import json
 
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
@@ -45,16 +46,20 @@ class GreatsList(APIView):
             logger.warning("User ID not provided.")
             return Response({"detail": "User ID not provided."}, status=status.HTTP_400_BAD_REQUEST)
 
-        queryset = Story.objects.filter(is_deleted=False)
+        # 위인 정보는 버전별로 캐시된 카탈로그에서, 퍼즐 개수는 사용자별 진행도 캐시에서 가져온다.
+        entries, digest = story_catalog.get().entries(nation, field)
+        progress = get_user_progress(user_id)
+        puzzle_cnts = [progress.get(entry['greatId'], 0) for entry in entries]
 
-        if nation:
-            queryset = queryset.filter(nation=nation)
-        if field:
-            queryset = queryset.filter(field=field)
+        etag = make_etag(digest, json.dumps(puzzle_cnts))
+        headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+        if etag_matches(request, etag):
+            logger.info("GreatsList GET request not modified.")
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
 
-        serializer = GreatsSerializer(queryset, many=True, context={'user_id': user_id})
+        data = [{**entry, 'puzzle_cnt': puzzle_cnt} for entry, puzzle_cnt in zip(entries, puzzle_cnts)]
         logger.info("GreatsList GET request successful.")
-        return Response(serializer.data)
+        return Response(data, headers=headers)
 
 
 class GreatDetail(APIView):
@@ -67,20 +72,24 @@ class GreatDetail(APIView):
         logger.info(f"GreatDetail GET request initiated for story_id: {user_id}")
         logger.info(f"GreatDetail GET request initiated for story_id: {story_id}")
 
-        try:
-            story = Story.objects.get(pk=story_id, is_deleted=False)
-        except Story.DoesNotExist:
+        detail, etag = story_catalog.get().detail(story_id)
+        if detail is None:
             logger.error(f"Story with id {story_id} not found.")
             return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        serializer = GreatDetailSerializer(story)
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if etag_matches(request, etag):
+            logger.info(f"GreatDetail GET request not modified for story_id: {story_id}")
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
         logger.info(f"GreatDetail GET request successful for story_id: {story_id}")
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(detail, status=status.HTTP_200_OK, headers=headers)
 
 class IncrementAccessCount(APIView):
     @swagger_auto_schema(
         operation_id="대화창 접속 수 증가하기",
-        operation_description="Redis Cache를 통해 대화창에 접속한 횟수만큼 증가하기",
+        operation_description="(호환용) 접속 수는 채팅 WebSocket 연결 시 서버에서 집계되므로 이 요청은 더 이상 접속 수를 올리지 않음",
+        deprecated=True,
         responses={"200": "성공"},
         manual_parameters=[
             openapi.Parameter(
@@ -102,17 +111,9 @@ class IncrementAccessCount(APIView):
             return Response({"detail": "적절한 access_cnt가 제공되지 않았습니다."}, status=status.HTTP_400_BAD_REQUEST)
 
         if access_cnt:
-            try:
-                redis_conn = get_redis_connection("default")
-                redis_key = f"story:{story_id}:access_cnt"
-                logger.debug(f"Fetching data from Redis with key: {redis_key}")
-                redis_conn.incr(redis_key)
-
-                logger.info(f"Access count incremented in Redis for story_id: {story_id}")
-                return Response({"detail": "성공"}, status=status.HTTP_200_OK)
-            except Exception as e:
-                logger.error(f"Failed to increment access count for story_id {story_id}: {str(e)}")
-                return Response({"detail": "실패"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            # ChatConsumer.connect에서 이미 집계하므로 두 번 세지 않도록 응답만 유지
+            logger.info(f"Access count for story_id {story_id} is recorded on WebSocket connect, no action taken.")
+            return Response({"detail": "성공"}, status=status.HTTP_200_OK)
         else:
             logger.warning("access_cnt is false, no action taken.")
             return Response({"detail": "access_cnt 값이 올바르지 않습니다."}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
@@ -1,7 +1,7 @@
 # tts/tasks.py
 import os
-import requests
 from django.conf import settings
+from backend.upstream import get_breaker, get_client
 from celery import shared_task
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
@@ -27,9 +27,14 @@ def process_tts(sentence):
         "xi-api-key": settings.ELEVENLABS_API_KEY
     }
 
-    response = requests.post(url, json=payload, headers=headers)
+    # 워커 프로세스마다 공유되는 keep-alive 커넥션 풀로 요청
+    # ElevenLabs 서킷이 열려 있으면 타임아웃까지 기다리지 않고 CircuitOpen으로 바로 실패한다.
+    def request_tts():
+        response = get_client('elevenlabs').post(url, json=payload, headers=headers)
+        response.raise_for_status()
+        return response
 
-    response.raise_for_status()
+    response = get_breaker('elevenlabs').call(request_tts)
 
     voice_data = response.content
 
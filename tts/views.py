@@ -68,6 +68,12 @@ class GetAudioResultView(APIView):
                     'error': openapi.Schema(type=openapi.TYPE_STRING, description='에러 메시지')
                 }
             ),
+            status.HTTP_503_SERVICE_UNAVAILABLE: openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'error': openapi.Schema(type=openapi.TYPE_STRING, description='TTS 변환 실패 또는 일시 차단')
+                }
+            ),
 
         }
     )
@@ -76,6 +82,10 @@ class GetAudioResultView(APIView):
         result = process_tts.AsyncResult(task_id)
 
 
+        # TTS 호출이 실패했거나 서킷이 열려 바로 실패한 경우
+        if result.failed():
+            return Response({"error": "음성 변환에 실패했습니다. 잠시 후 다시 시도해 주세요."}, status = status.HTTP_503_SERVICE_UNAVAILABLE)
+
         if result.ready():
             file_path = result.result
 